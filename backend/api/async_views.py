@@ -0,0 +1,67 @@
+"""Асинхронные обёртки читающих эндпоинтов для запуска под ASGI.
+
+ORM в Django 3.2 только синхронный, поэтому представление DRF
+выполняется целиком в общем пуле потоков sync_to_async, а не в одном
+потоке thread_sensitive, через который Django под ASGI пропускает все
+синхронные представления процесса. Ответ отдаётся клиенту циклом
+событий уже после того, как поток освободился, так что медленные
+клиенты не держат ни поток, ни воркер. Размер пула задаёт переменная
+окружения ASGI_THREADS.
+"""
+import time
+
+from asgiref.sync import sync_to_async
+
+from django.db import close_old_connections
+from django.http import HttpResponse
+
+# Имена маршрутов роутера, которые обслуживаются асинхронно.
+ASYNC_ROUTES = (
+    'tags-list',
+    'tags-detail',
+    'ingredients-autocomplete',
+    'recipes-detail',
+    'recipes-download-shopping-cart',
+)
+
+
+def buffer_streaming(response):
+    """Собирает потоковый ответ в обычный.
+
+    Django 3.2 под ASGI читает потоковый ответ синхронно прямо в цикле
+    событий, где запросы к базе запрещены.
+    """
+    buffered = HttpResponse(
+        b''.join(response.streaming_content), status=response.status_code
+    )
+    for header, value in response.items():
+        buffered[header] = value
+    return buffered
+
+
+def run_view(view, request, args, kwargs):
+    # Сигналы начала и конца запроса не доходят до потоков пула,
+    # поэтому устаревшие соединения закрываются здесь, как в channels.
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if callable(getattr(response, 'render', None)):
+            started = time.perf_counter()
+            response.render()
+            request.metrics_render = time.perf_counter() - started
+        if response.streaming:
+            response = buffer_streaming(response)
+        return response
+    finally:
+        close_old_connections()
+
+
+def async_view(view):
+    """Асинхронное представление поверх синхронного представления DRF."""
+    run = sync_to_async(run_view, thread_sensitive=False)
+
+    async def handler(request, *args, **kwargs):
+        return await run(view, request, args, kwargs)
+
+    handler.csrf_exempt = getattr(view, 'csrf_exempt', False)
+    return handler
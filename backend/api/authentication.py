@@ -0,0 +1,121 @@
+"""Аутентификация по токену с кэшем пользователей."""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache import is_shared
+
+KEY_PREFIX = 'auth-token'
+
+
+class LRUCache:
+    """Ограниченный по размеру кэш процесса с временем жизни записей."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class TokenCache:
+    """Кэш пар (пользователь, токен) по ключу токена в два уровня.
+
+    Первый уровень живёт в памяти процесса, второй в общем кэше Django.
+    Сброс по сигналам удаляет запись из общего кэша и из памяти текущего
+    процесса, в остальных процессах запись доживает TOKEN_CACHE_LOCAL_TTL.
+    Если кэш Django не общий (LocMemCache), второй уровень не
+    используется: иначе другой процесс снова брал бы из своей копии
+    отозванный токен до конца TOKEN_CACHE_TIMEOUT.
+    """
+
+    def __init__(self):
+        self.local = LRUCache(
+            settings.TOKEN_CACHE_SIZE, settings.TOKEN_CACHE_LOCAL_TTL
+        )
+
+    @staticmethod
+    def shared_key(key):
+        return f'{KEY_PREFIX}:{key}'
+
+    def get(self, key):
+        pair = self.local.get(key)
+        if pair is None:
+            if not is_shared():
+                return None
+            pair = cache.get(self.shared_key(key))
+            if pair is None:
+                return None
+            self.local.set(key, pair)
+        # Каждый запрос получает свою копию пользователя.
+        user, token = pair
+        return copy.copy(user), token
+
+    def set(self, key, user, token):
+        pair = (copy.copy(user), token)
+        self.local.set(key, pair)
+        if is_shared():
+            cache.set(
+                self.shared_key(key), pair, settings.TOKEN_CACHE_TIMEOUT
+            )
+
+    def invalidate(self, keys):
+        keys = list(keys)
+        for key in keys:
+            self.local.delete(key)
+        if is_shared():
+            cache.delete_many([self.shared_key(key) for key in keys])
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к базе для известных токенов."""
+
+    def authenticate_credentials(self, key):
+        pair = token_cache.get(key)
+        if pair is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user, token)
+            return user, token
+        user, token = pair
+        if not user.is_active:
+            raise AuthenticationFailed('User inactive or deleted.')
+        return user, token
@@ -0,0 +1,148 @@
+"""Кэш ответов справочных эндпоинтов с условными GET-запросами."""
+import hashlib
+import time
+import uuid
+
+from rest_framework.response import Response
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date, quote_etag
+
+KEY_PREFIX = 'api-cache'
+
+# Эти бэкенды живут в памяти процесса, другие воркеры их не видят.
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+
+def is_shared(alias='default'):
+    """Видны ли записи кэша всем процессам приложения."""
+    return not isinstance(caches[alias], PROCESS_LOCAL_BACKENDS)
+
+
+def _key(*parts):
+    return ':'.join((KEY_PREFIX, *map(str, parts)))
+
+
+def bump_version(namespace):
+    """Делает устаревшими все закэшированные ответы пространства имён."""
+    state = {'version': uuid.uuid4().hex, 'modified': int(time.time())}
+    cache.set(_key(namespace, 'version'), state, None)
+    return state
+
+
+def get_version(namespace):
+    state = cache.get(_key(namespace, 'version'))
+    if state is None:
+        state = bump_version(namespace)
+    return state
+
+
+def _count(namespace, outcome, delta=1):
+    if not delta:
+        return
+    key = _key('stats', namespace, outcome)
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        cache.set(key, delta, None)
+
+
+def get_stats(namespaces):
+    """Попадания и промахи кэша по пространствам имён."""
+    stats = {}
+    for namespace in namespaces:
+        hits = cache.get(_key('stats', namespace, 'hit'), 0)
+        misses = cache.get(_key('stats', namespace, 'miss'), 0)
+        total = hits + misses
+        stats[namespace] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else None,
+        }
+    return stats
+
+
+def cached_fragments(namespace, ids, build):
+    """Фрагменты ответа по id, недостающие строятся вызовом build(ids).
+
+    Фрагменты хранятся под текущей версией пространства имён
+    и устаревают вместе с закэшированными страницами.
+    """
+    version = get_version(namespace)['version']
+    keys = {_key(namespace, version, 'fragment', pk): pk for pk in ids}
+    fragments = {
+        keys[key]: value for key, value in cache.get_many(keys).items()
+    }
+    missing = [pk for pk in ids if pk not in fragments]
+    _count(f'{namespace}-fragments', 'hit', len(fragments))
+    _count(f'{namespace}-fragments', 'miss', len(missing))
+    if missing:
+        built = build(missing)
+        cache.set_many({
+            _key(namespace, version, 'fragment', pk): value
+            for pk, value in built.items()
+        })
+        fragments.update(built)
+    return fragments
+
+
+class CachedResponseMixin:
+    """Кэширует ответы list/retrieve и отвечает 304 на условные запросы.
+
+    Ключ ответа включает версию пространства имён cache_namespace,
+    которую сигналы сохранения и удаления моделей меняют на новую.
+    Клиенты и прокси обязаны перепроверять ответ по ETag и не отдавать
+    его запросу с другим заголовком Authorization.
+    """
+
+    cache_namespace = None
+
+    def use_cache(self, request):
+        return True
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_cache(request):
+            return super().list(request, *args, **kwargs)
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_cache(request):
+            return super().retrieve(request, *args, **kwargs)
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        state = get_version(self.cache_namespace)
+        path = request.get_full_path()
+        etag = quote_etag(hashlib.md5(
+            f"{self.cache_namespace}:{state['version']}:{path}".encode()
+        ).hexdigest())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=state['modified']
+        )
+        if response is None:
+            key = _key(
+                self.cache_namespace, state['version'],
+                hashlib.md5(path.encode()).hexdigest(),
+            )
+            data = cache.get(key)
+            if data is None:
+                _count(self.cache_namespace, 'miss')
+                response = handler(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+                cache.set(key, response.data)
+            else:
+                _count(self.cache_namespace, 'hit')
+                response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(state['modified'])
+        patch_vary_headers(response, ('Authorization',))
+        patch_cache_control(response, no_cache=True)
+        return response
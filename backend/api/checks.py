@@ -0,0 +1,68 @@
+import os
+
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+from foodgram_backend import gunicorn_conf
+
+from .cache import is_shared
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Несколько воркеров gunicorn требуют общего кэша.
+
+    Кэш ответов, версии пространств имён и токены сбрасываются
+    сигналами в том процессе, где произошло изменение. С кэшем в памяти
+    процесса остальные воркеры отдавали бы устаревшие данные.
+    """
+    workers = int(os.getenv('GUNICORN_WORKERS') or 1)
+    if workers > 1 and not is_shared():
+        return [Error(
+            f'GUNICORN_WORKERS={workers}, а кэш Django живёт в памяти '
+            'процесса.',
+            hint=(
+                'Задайте общий CACHE_BACKEND и CACHE_LOCATION (memcached, '
+                'файловый кэш) или уберите GUNICORN_WORKERS.'
+            ),
+            id='api.E001',
+        )]
+    return []
+
+
+def pool_consumers():
+    """Сколько потоков воркера могут одновременно держать соединение."""
+    if 'uvicorn' in gunicorn_conf.worker_class:
+        # Синхронные представления идут в одном потоке thread_sensitive,
+        # асинхронные обёртки - в пуле sync_to_async размером ASGI_THREADS
+        # или, по умолчанию, как у ThreadPoolExecutor.
+        threads = 1 + int(
+            os.getenv('ASGI_THREADS') or min(32, (os.cpu_count() or 1) + 4)
+        )
+    else:
+        threads = gunicorn_conf.threads
+    return threads + settings.RECIPE_IMAGE_WORKERS
+
+
+@register()
+def check_pool_size(app_configs, **kwargs):
+    """Пула соединений хватает всем потокам воркера.
+
+    Иначе запросы ждут свободного соединения и при нехватке дольше
+    POOL['timeout'] получают ошибку.
+    """
+    options = settings.DATABASES['default'].get('POOL')
+    if not options:
+        return []
+    consumers = pool_consumers()
+    if options['max_size'] < consumers:
+        return [Warning(
+            f"DB_POOL_MAX_SIZE={options['max_size']} меньше числа потоков "
+            f'воркера, которым нужна база: {consumers}.',
+            hint=(
+                'Учитываются потоки запросов (GUNICORN_THREADS или '
+                'ASGI_THREADS) и RECIPE_IMAGE_WORKERS.'
+            ),
+            id='api.W001',
+        )]
+    return []
@@ -0,0 +1,126 @@
+"""Сжатие ответов API: brotli, если клиент его принимает, иначе gzip.
+
+Сжимаются только JSON и текстовые выгрузки. HTML с CSRF-токеном
+(админка, browsable API) не сжимается, чтобы не открывать BREACH.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/plain', 'text/csv')
+
+
+def brotli_string(content):
+    return brotli.compress(
+        content, quality=settings.COMPRESSION_BROTLI_QUALITY
+    )
+
+
+def brotli_sequence(sequence):
+    compressor = brotli.Compressor(
+        quality=settings.COMPRESSION_BROTLI_QUALITY
+    )
+    for item in sequence:
+        data = compressor.process(item) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+# В порядке предпочтения сервера.
+ENCODINGS = {'gzip': (compress_string, compress_sequence)}
+if brotli is not None:
+    ENCODINGS = {'br': (brotli_string, brotli_sequence), **ENCODINGS}
+
+
+def choose_encoding(accept_encoding):
+    """Первое из ENCODINGS, которое клиент принимает, или None."""
+    weights = {}
+    for part in accept_encoding.split(','):
+        coding, _, params = part.partition(';')
+        weight = 1.0
+        name, _, value = params.partition('=')
+        if name.strip() == 'q':
+            try:
+                weight = float(value)
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+    for coding in ENCODINGS:
+        if weights.get(coding, weights.get('*', 0.0)) > 0:
+            return coding
+    return None
+
+
+class CompressionMiddleware:
+    """Сжимает ответы больше COMPRESSION_MIN_SIZE байт.
+
+    Потоковые ответы сжимаются всегда, их размер заранее неизвестен.
+    Как и GZipMiddleware, ослабляет ETag сжатого ответа, условные
+    запросы при этом продолжают работать.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        # Сжатие занимает процессор, в цикле событий оно задержало бы
+        # всех клиентов процесса.
+        return await sync_to_async(
+            self.process_response, thread_sensitive=False
+        )(request, response)
+
+    def process_response(self, request, response):
+        if (
+            not response.streaming
+            and len(response.content) < settings.COMPRESSION_MIN_SIZE
+        ):
+            return response
+        if response.has_header('Content-Encoding'):
+            return response
+        content_type = response.get('Content-Type', '')
+        if not content_type.startswith(COMPRESSIBLE_TYPES):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        if encoding is None:
+            return response
+        compress, compress_stream = ENCODINGS[encoding]
+        if response.streaming:
+            response.streaming_content = compress_stream(
+                response.streaming_content
+            )
+            del response['Content-Length']
+        else:
+            compressed = compress(response.content)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
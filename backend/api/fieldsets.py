@@ -0,0 +1,85 @@
+"""Разреженные наборы полей в ответах: ?fields= и ?expand=."""
+from rest_framework.response import Response
+
+
+def ids(objects):
+    return [item['id'] for item in objects]
+
+
+def pick(*names):
+    """Сворачивает список объектов до указанных полей."""
+    def collapse(objects):
+        return [{name: item[name] for name in names} for item in objects]
+    return collapse
+
+
+def parse_names(values):
+    """Имена из параметров вида ?fields=a,b&fields=c."""
+    return {
+        name.strip()
+        for value in values
+        for name in value.split(',')
+        if name.strip()
+    }
+
+
+class SparseFieldsetMixin:
+    """Урезает GET-ответы по параметрам ?fields= и ?expand=.
+
+    fields перечисляет нужные поля объекта, id остаётся всегда.
+    Если задан любой из параметров, вложенные объекты из
+    collapsed_fields сворачиваются до id, кроме перечисленных
+    в expand, пустые (None) остаются как есть. Без параметров ответ
+    не меняется. Урезается уже готовый ответ, поэтому кэш ответов
+    и фрагментов хранит полные объекты.
+    """
+
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+    # Поле -> функция, сворачивающая его значение.
+    collapsed_fields = {}
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        params = request.query_params
+        if (
+            request.method == 'GET'
+            and isinstance(response, Response)
+            and response.status_code == 200
+            and response.data is not None
+            and (
+                self.fields_query_param in params
+                or self.expand_query_param in params
+            )
+        ):
+            response.data = self.sparse_data(
+                response.data,
+                parse_names(params.getlist(self.fields_query_param)),
+                parse_names(params.getlist(self.expand_query_param)),
+            )
+        return response
+
+    def sparse_data(self, data, fields, expand):
+        if isinstance(data, list):
+            return [self.sparse_item(item, fields, expand) for item in data]
+        if isinstance(data.get('results'), list):
+            return dict(data, results=self.sparse_data(
+                data['results'], fields, expand
+            ))
+        return self.sparse_item(data, fields, expand)
+
+    def sparse_item(self, item, fields, expand):
+        result = {}
+        for name, value in item.items():
+            if fields and name != 'id' and name not in fields:
+                continue
+            if (
+                name in self.collapsed_fields
+                and name not in expand
+                and value is not None
+            ):
+                value = self.collapsed_fields[name](value)
+            result[name] = value
+        return result
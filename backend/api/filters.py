@@ -1,6 +1,12 @@
 from django_filters.rest_framework import FilterSet, filters
 
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            TrigramSimilarity)
+from django.db import connections
+from django.db.models import Exists, OuterRef, Q
+
 from foodgram.models import Ingredient, Recipe, Tag
+from foodgram.search import SEARCH_CONFIG, recipe_search_vector
 from users.models import User
 
 
@@ -20,7 +26,8 @@ class RecipeFilter(FilterSet):
     tags = filters.ModelMultipleChoiceFilter(
         field_name='tags__slug',
         to_field_name='slug',
-        queryset=Tag.objects.all()
+        queryset=Tag.objects.all(),
+        method='filter_tags',
     )
     author = filters.ModelChoiceFilter(
         queryset=User.objects.all()
@@ -31,19 +38,67 @@ class RecipeFilter(FilterSet):
     is_favorited = filters.BooleanFilter(
         method='filter_is_favorited'
     )
+    search = filters.CharFilter(method='filter_search')
+    ordering = filters.ChoiceFilter(
+        choices=(('popular', 'По числу добавлений в избранное'),),
+        method='filter_ordering',
+    )
 
     class Meta:
         model = Recipe
-        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart')
+        fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',
+                  'search', 'ordering')
+
+    def filter_tags(self, queryset, name, value):
+        """Рецепты хотя бы с одним из тегов, каждый рецепт один раз.
+
+        Подзапрос Exists не размножает строки, как соединение
+        с таблицей тегов, и не требует DISTINCT.
+        """
+        if not value:
+            return queryset
+        return queryset.filter(Exists(Recipe.tags.through.objects.filter(
+            recipe=OuterRef('pk'), tag__in=value
+        )))
 
     def filter_is_favorited(self, queryset, name, value):
         user = self.request.user
         if value and not user.is_anonymous:
-            return queryset.filter(favorited__user=user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         user = self.request.user
         if value and not user.is_anonymous:
-            return queryset.filter(shopping_cart__user=user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Поиск по названию и описанию, лучшие совпадения первыми.
+
+        На PostgreSQL используется полнотекстовый поиск с русской
+        морфологией и триграммы по названию для опечаток, на остальных
+        базах — поиск подстроки.
+        """
+        value = value.strip()
+        if not value:
+            return queryset
+        if connections[queryset.db].vendor != 'postgresql':
+            return queryset.filter(
+                Q(name__icontains=value) | Q(text__icontains=value)
+            )
+        query = SearchQuery(
+            value, config=SEARCH_CONFIG, search_type='websearch'
+        )
+        vector = recipe_search_vector()
+        return queryset.annotate(
+            search_vector=vector,
+            search_rank=SearchRank(vector, query),
+            similarity=TrigramSimilarity('name', value),
+        ).filter(
+            Q(search_vector=query) | Q(name__trigram_similar=value)
+        ).order_by('-search_rank', '-similarity', '-pub_date')
+
+    def filter_ordering(self, queryset, name, value):
+        # Счётчик хранится в рецепте, COUNT по избранному не нужен.
+        return queryset.order_by('-favorites_count', '-pub_date', '-id')
@@ -0,0 +1,277 @@
+"""Метрики запросов: число и время SQL, сериализация, рендеринг, задержка.
+
+Значения копятся в памяти процесса и отдаются в текстовом формате
+Prometheus на /api/metrics/, каждый воркер отдаёт свои.
+"""
+import asyncio
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Registry:
+    """Гистограммы по имени метрики и набору меток."""
+
+    metrics = {
+        'foodgram_request_duration_seconds': (
+            'Время обработки запроса.', LATENCY_BUCKETS
+        ),
+        'foodgram_db_queries': (
+            'Число SQL-запросов на запрос.', QUERY_BUCKETS
+        ),
+        'foodgram_db_duration_seconds': (
+            'Время SQL-запросов на запрос.', LATENCY_BUCKETS
+        ),
+        'foodgram_serialize_duration_seconds': (
+            'Время сериализации ответа, включая запросы из неё.',
+            LATENCY_BUCKETS,
+        ),
+        'foodgram_render_duration_seconds': (
+            'Время рендеринга ответа.', LATENCY_BUCKETS
+        ),
+    }
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.histograms = {name: {} for name in self.metrics}
+        self.responses = {}
+
+    def observe(self, labels, status, values):
+        with self.lock:
+            for name, value in values.items():
+                histograms = self.histograms[name]
+                if labels not in histograms:
+                    histograms[labels] = Histogram(self.metrics[name][1])
+                histograms[labels].observe(value)
+            key = (*labels, str(status))
+            self.responses[key] = self.responses.get(key, 0) + 1
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, (help_text, buckets) in self.metrics.items():
+                lines.append(f'# HELP {name} {help_text}')
+                lines.append(f'# TYPE {name} histogram')
+                for labels, histogram in self.histograms[name].items():
+                    base = format_labels(labels)
+                    total = 0
+                    for bound, count in zip(
+                        (*buckets, '+Inf'), histogram.counts
+                    ):
+                        total += count
+                        lines.append(
+                            f'{name}_bucket{{{base},le="{bound}"}} {total}'
+                        )
+                    lines.append(f'{name}_sum{{{base}}} {histogram.sum:g}')
+                    lines.append(f'{name}_count{{{base}}} {histogram.count}')
+            name = 'foodgram_responses_total'
+            lines.append(f'# HELP {name} Ответы по коду статуса.')
+            lines.append(f'# TYPE {name} counter')
+            for (*labels, status), count in self.responses.items():
+                lines.append(
+                    f'{name}{{{format_labels(labels)},status="{status}"}} '
+                    f'{count}'
+                )
+        return lines
+
+
+def format_labels(labels):
+    endpoint, method = labels
+    return f'endpoint="{endpoint}",method="{method}"'
+
+
+registry = Registry()
+
+
+class QueryCounter:
+    """Обёртка execute_wrapper, считающая запросы и их время."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+current_counter = ContextVar('current_counter', default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    """Постоянная обёртка соединений, считает запросы в счётчик запроса.
+
+    Под ASGI запросы к базе идут из потоков sync_to_async со своими
+    соединениями, счётчик запроса попадает туда через contextvar.
+    """
+    counter = current_counter.get()
+    if counter is None:
+        return execute(sql, params, many, context)
+    return counter(execute, sql, params, many, context)
+
+
+class SerializationTimer:
+    """Время сериализаторов верхнего уровня за запрос.
+
+    Вложенные сериализаторы выполняются внутри внешнего, их время
+    повторно не прибавляется.
+    """
+
+    def __init__(self):
+        self.duration = 0
+        self.depth = 0
+
+    def __call__(self, represent, instance):
+        if self.depth:
+            return represent(instance)
+        self.depth += 1
+        started = time.perf_counter()
+        try:
+            return represent(instance)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.depth -= 1
+
+
+current_timer = ContextVar('current_timer', default=None)
+
+
+def measure_serialization(represent, instance):
+    """Вызывает represent(instance), засекая время в таймер запроса."""
+    timer = current_timer.get()
+    if timer is None:
+        return represent(instance)
+    return timer(represent, instance)
+
+
+@receiver(connection_created)
+def install_query_counter(connection, **kwargs):
+    # В начало списка: execute_wrapper() снимает при выходе последнюю
+    # обёртку, и соединение, открытое внутри него, иначе сняло бы нашу.
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, count_queries)
+
+
+class MetricsMiddleware:
+    """Снимает метрики каждого запроса и подписывает их именем маршрута.
+
+    Имя берётся из resolver_match.url_name, для DRF это
+    например recipes-list или recipes-download-shopping-cart.
+    Запросы, сделавшие больше METRICS_QUERY_THRESHOLD обращений
+    к базе, пишутся в лог как кандидаты в N+1.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Так Django понимает, что middleware вызывается через await,
+            # и не переводит цепочку под ASGI в синхронный режим.
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not settings.METRICS_ENABLED:
+            return self.get_response(request)
+        counter, timer = QueryCounter(), SerializationTimer()
+        request.metrics_render = 0
+        started = time.perf_counter()
+        # Соединения, открытые до загрузки middleware, сигнал не застал.
+        for connection in connections.all():
+            install_query_counter(connection)
+        tokens = current_counter.set(counter), current_timer.set(timer)
+        try:
+            response = self.get_response(request)
+        finally:
+            self.reset(tokens)
+        self.record(request, response, counter, timer, started)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.METRICS_ENABLED:
+            return await self.get_response(request)
+        counter, timer = QueryCounter(), SerializationTimer()
+        request.metrics_render = 0
+        started = time.perf_counter()
+        tokens = current_counter.set(counter), current_timer.set(timer)
+        try:
+            response = await self.get_response(request)
+        finally:
+            self.reset(tokens)
+        self.record(request, response, counter, timer, started)
+        return response
+
+    @staticmethod
+    def reset(tokens):
+        counter_token, timer_token = tokens
+        current_counter.reset(counter_token)
+        current_timer.reset(timer_token)
+
+    @staticmethod
+    def record(request, response, counter, timer, started):
+        latency = time.perf_counter() - started
+        match = request.resolver_match
+        endpoint = match.url_name if match and match.url_name else (
+            'unresolved'
+        )
+        registry.observe((endpoint, request.method), response.status_code, {
+            'foodgram_request_duration_seconds': latency,
+            'foodgram_db_queries': counter.count,
+            'foodgram_db_duration_seconds': counter.duration,
+            'foodgram_serialize_duration_seconds': timer.duration,
+            'foodgram_render_duration_seconds': request.metrics_render,
+        })
+        threshold = settings.METRICS_QUERY_THRESHOLD
+        if threshold and counter.count > threshold:
+            logger.warning(
+                'Возможен N+1: %s %s (%s) сделал %d SQL-запросов',
+                request.method, request.path, endpoint, counter.count,
+            )
+
+    def process_template_response(self, request, response):
+        if response.is_rendered:
+            # Асинхронные представления рендерят ответ сами.
+            return response
+        # Ответы DRF рендерятся после этого хука.
+        started = time.perf_counter()
+
+        def finished(response):
+            request.metrics_render = time.perf_counter() - started
+
+        response.add_post_render_callback(finished)
+        return response
@@ -1,7 +1,158 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from django.db.models import Q
+
+
+class KeysetPagination(BasePagination):
+    """Пагинация по ключу сортировки без OFFSET и COUNT(*).
+
+    Курсор хранит значения полей сортировки последнего объекта
+    страницы, следующая страница выбирается условием «после ключа».
+    Сортировка дополняется первичным ключом, чтобы ключ был уникален.
+    """
+
+    cursor_query_param = 'cursor'
+    page_size = 10
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*self.ordering)
+        values, self.reverse = self.decode_cursor(request)
+        if self.reverse:
+            queryset = queryset.order_by(
+                *(self.invert(field) for field in self.ordering)
+            )
+        if values is not None:
+            queryset = queryset.filter(self.after(values))
+        page = list(queryset[:self.page_size + 1])
+        has_more = len(page) > self.page_size
+        page = page[:self.page_size]
+        if self.reverse:
+            page.reverse()
+        self.has_next = has_more if not self.reverse else True
+        self.has_previous = has_more if self.reverse else values is not None
+        self.page = page
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    @staticmethod
+    def invert(field):
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def get_ordering(queryset):
+        ordering = list(
+            queryset.query.order_by or queryset.model._meta.ordering
+        )
+        if not all(isinstance(field, str) for field in ordering):
+            raise TypeError(
+                'Курсорная пагинация поддерживает только сортировку '
+                'по именам полей.'
+            )
+        if not {'pk', 'id', '-pk', '-id'} & set(ordering):
+            descending = bool(ordering) and ordering[-1].startswith('-')
+            ordering.append('-pk' if descending else 'pk')
+        return ordering
+
+    def after(self, values):
+        """Условие «строго после ключа» для текущего направления."""
+        ordering = self.ordering
+        if self.reverse:
+            ordering = [self.invert(field) for field in ordering]
+        condition = Q()
+        equal = Q()
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        first = ordering[0]
+        bound = 'lte' if first.startswith('-') else 'gte'
+        return Q(**{f'{first.lstrip("-")}__{bound}': values[0]}) & condition
+
+    def get_key(self, instance):
+        values = []
+        for field in self.ordering:
+            value = instance
+            for attribute in field.lstrip('-').split('__'):
+                value = getattr(value, attribute)
+            if isinstance(value, (date, datetime)):
+                value = value.isoformat()
+            values.append(value)
+        return values
+
+    @staticmethod
+    def make_cursor(values, reverse=False):
+        payload = json.dumps({'k': values, 'r': reverse})
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    def encode_cursor(self, instance, reverse):
+        cursor = self.make_cursor(self.get_key(instance), reverse)
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, 'page')
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            values, reverse = payload['k'], bool(payload['r'])
+        except (binascii.Error, ValueError, TypeError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values, reverse
 
 
 class CustomPagination(PageNumberPagination):
-    """Кастомный пагинатор."""
+    """Кастомный пагинатор.
+
+    По умолчанию постраничный (page/limit). Если в запросе есть
+    параметр cursor (в том числе пустой для первой страницы),
+    используется курсорная пагинация KeysetPagination.
+    """
 
     page_size_query_param = 'limit'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = None
+        if KeysetPagination.cursor_query_param not in request.query_params:
+            return super().paginate_queryset(queryset, request, view)
+        self.keyset = KeysetPagination()
+        self.keyset.page_size = (
+            self.get_page_size(request) or self.keyset.page_size
+        )
+        return self.keyset.paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -1,5 +1,7 @@
 from rest_framework import permissions
 
+from django.conf import settings
+
 
 class IsAdminOrReadOnly(permissions.BasePermission):
 
@@ -17,3 +19,13 @@ class IsAuthorOrAdminOrReadOnly(permissions.BasePermission):
             or request.method in permissions.SAFE_METHODS
             or request.user.is_superuser
         )
+
+
+class IsStaffOrMetricsIP(permissions.BasePermission):
+    """Метрики видят сотрудники и сборщик метрик с разрешённых адресов."""
+
+    def has_permission(self, request, view):
+        return (
+            request.user.is_staff
+            or request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+        )
@@ -1,33 +1,103 @@
 import base64
+import binascii
 
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import serializers, status
 from rest_framework.exceptions import ValidationError
 from rest_framework.fields import SerializerMethodField
 
+from django.conf import settings
 from django.core.files.base import ContentFile
 from django.db import transaction
-from django.db.models import F
 from django.shortcuts import get_object_or_404
 
-from foodgram.models import AmountIngredient, Ingredient, Recipe, Tag
+from foodgram.models import (AmountIngredient, Ingredient, Recipe,
+                             ShoppingListLine, Tag, delete_rows)
 from users.models import Follow, User
 
+from .metrics import measure_serialization
+
+
+def get_recipes_limit(request):
+    """Значение recipes_limit из запроса или None, если оно не задано."""
+    try:
+        return max(int(request.query_params['recipes_limit']), 0)
+    except (KeyError, ValueError):
+        return None
+
 
 class Base64ImageField(serializers.ImageField):
     """Класс для кодирования картинок перед загрузкой."""
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
+            format, _, imgstr = data.partition(';base64,')
             ext = format.split('/')[-1]
-
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            # Размер проверяется по длине строки, до декодирования.
+            if len(imgstr) * 3 // 4 > settings.RECIPE_IMAGE_MAX_SIZE:
+                raise ValidationError(
+                    'Размер изображения больше '
+                    f'{settings.RECIPE_IMAGE_MAX_SIZE / 1024 ** 2:g} МБ'
+                )
+            try:
+                content = base64.b64decode(imgstr, validate=True)
+            except binascii.Error:
+                raise ValidationError('Изображение не в формате base64')
+            data = ContentFile(content, name='temp.' + ext)
 
         return super().to_internal_value(data)
 
 
-class UserSerializer(UserSerializer):
+class RecipeImageField(serializers.Field):
+    """Ссылка на уменьшенную копию изображения, пока её нет — на оригинал.
+
+    Без явного variant копия выбирается по действию: в списках
+    отдаётся миниатюра, на странице рецепта — крупная копия.
+    """
+
+    def __init__(self, variant=None, **kwargs):
+        self.variant = variant
+        kwargs.update(source='*', read_only=True)
+        super().__init__(**kwargs)
+
+    def get_variant(self):
+        if self.variant is not None:
+            return self.variant
+        view = self.context.get('view')
+        if view is not None and view.action == 'list':
+            return 'thumbnail'
+        return 'detail'
+
+    def to_representation(self, recipe):
+        name = recipe.image_variants.get(self.get_variant())
+        if name is None:
+            return recipe.image.url
+        return recipe.image.storage.url(name)
+
+
+class FastRepresentationMixin:
+    """Быстрый путь чтения: dict собирается в represent() напрямую.
+
+    Обычный to_representation для каждого поля вызывает get_attribute
+    и to_representation поля и собирает OrderedDict, в ленте это
+    основная часть времени сериализации. represent() повторяет вывод
+    полей из Meta.fields побайтно и ждёт подгруженных связей.
+    С fast_representation = False сериализаторы работают как обычные
+    ModelSerializer, так bench_serializers сверяет вывод. Время вывода
+    попадает в метрику foodgram_serialize_duration_seconds.
+    """
+
+    fast_representation = True
+
+    def to_representation(self, instance):
+        if not self.fast_representation:
+            return measure_serialization(
+                super().to_representation, instance
+            )
+        return measure_serialization(self.represent, instance)
+
+
+class UserSerializer(FastRepresentationMixin, UserSerializer):
     """Сериализатор для пользователей foodgram."""
 
     is_subscribed = SerializerMethodField(read_only=True)
@@ -47,8 +117,20 @@ class UserSerializer(UserSerializer):
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return Follow.objects.filter(user=user, author=obj).exists()
 
+    def represent(self, user):
+        return {
+            'email': user.email,
+            'id': user.id,
+            'username': user.username,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'is_subscribed': self.get_is_subscribed(user),
+        }
+
 
 class UserCreateSerializer(UserCreateSerializer):
     """Сериализатор для регистрации пользователей foodgram."""
@@ -65,21 +147,37 @@ class UserCreateSerializer(UserCreateSerializer):
         )
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(FastRepresentationMixin, serializers.ModelSerializer):
     """Сериализатор тэгов."""
 
     class Meta:
         model = Tag
         fields = ('id', 'name', 'color', 'slug',)
 
+    def represent(self, tag):
+        return {
+            'id': tag.id,
+            'name': tag.name,
+            'color': tag.color,
+            'slug': tag.slug,
+        }
+
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(FastRepresentationMixin,
+                           serializers.ModelSerializer):
     """Сериализатор ингридиентов."""
 
     class Meta:
         model = Ingredient
         fields = ('id', 'name', 'measurement_unit',)
 
+    def represent(self, ingredient):
+        return {
+            'id': ingredient.id,
+            'name': ingredient.name,
+            'measurement_unit': ingredient.measurement_unit,
+        }
+
 
 class AmountIngredientSerializer(serializers.ModelSerializer):
     """Сериализатор количества ингридиентов в блюде."""
@@ -91,7 +189,8 @@ class AmountIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount',)
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(FastRepresentationMixin,
+                           serializers.ModelSerializer):
     """Сериализатор для просмотра рецептов."""
 
     tags = TagSerializer(many=True, read_only=True)
@@ -99,7 +198,7 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     ingredients = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = serializers.CharField(source='image.url')
+    image = RecipeImageField()
 
     class Meta:
         model = Recipe
@@ -108,27 +207,51 @@ class RecipeReadSerializer(serializers.ModelSerializer):
                   'name', 'image', 'text', 'cooking_time',)
 
     def get_ingredients(self, obj):
-        recipe = obj
-        ingredients = recipe.ingredients.values(
-            'id',
-            'name',
-            'measurement_unit',
-            amount=F('ingredient__amount')
-        )
-        return ingredients
+        return [
+            {
+                'id': amount.ingredient.id,
+                'name': amount.ingredient.name,
+                'measurement_unit': amount.ingredient.measurement_unit,
+                'amount': amount.amount,
+            }
+            for amount in obj.ingredient_to_recipes.all()
+        ]
 
     def get_is_favorited(self, obj):
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         return user.favorited.filter(recipe=obj).exists()
 
     def get_is_in_shopping_cart(self, obj):
         user = self.context.get('request').user
         if user.is_anonymous:
             return False
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         return user.shopping_cart.filter(recipe=obj).exists()
 
+    def represent(self, recipe):
+        fields = self.fields
+        tags = fields['tags'].child
+        return {
+            'id': recipe.id,
+            'tags': [tags.represent(tag) for tag in recipe.tags.all()],
+            'author': (
+                None if recipe.author is None
+                else fields['author'].represent(recipe.author)
+            ),
+            'ingredients': self.get_ingredients(recipe),
+            'is_favorited': self.get_is_favorited(recipe),
+            'is_in_shopping_cart': self.get_is_in_shopping_cart(recipe),
+            'name': recipe.name,
+            'image': fields['image'].to_representation(recipe),
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+        }
+
 
 class CreateRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для добавления новых рецептов."""
@@ -165,32 +288,79 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         return cooking_time
 
     def validate_ingredients(self, ingredients):
-        ingredients_list = []
         if not ingredients:
             raise serializers.ValidationError(
                 'Отсутствуют ингридиенты')
+        ingredient_ids = {ingredient['id'] for ingredient in ingredients}
+        if len(ingredient_ids) != len(ingredients):
+            raise serializers.ValidationError(
+                'Ингридиенты должны быть уникальны')
         for ingredient in ingredients:
-            if ingredient['id'] in ingredients_list:
-                raise serializers.ValidationError(
-                    'Ингридиенты должны быть уникальны')
-            ingredients_list.append(ingredient['id'])
             if int(ingredient.get('amount')) < 1:
                 raise serializers.ValidationError(
                     'Количество ингредиента больше 0')
+        unknown = ingredient_ids - Ingredient.objects.in_bulk(
+            ingredient_ids
+        ).keys()
+        if unknown:
+            raise serializers.ValidationError(
+                'Ингридиенты не найдены: '
+                + ', '.join(map(str, sorted(unknown)))
+            )
         return ingredients
 
     @staticmethod
     def create_ingredients(recipe, ingredients):
-        ingredient_list = []
-        for ingredient in ingredients:
-            ingredient_list.append(
-                AmountIngredient(
-                    ingredient=Ingredient.objects.get(id=ingredient['id']),
-                    recipe=recipe,
-                    amount=ingredient['amount'],
-                )
+        AmountIngredient.objects.bulk_create(
+            AmountIngredient(
+                ingredient_id=ingredient['id'],
+                recipe=recipe,
+                amount=ingredient['amount'],
+            )
+            for ingredient in ingredients
+        )
+
+    @staticmethod
+    def update_ingredients(recipe, ingredients):
+        """Приводит ингредиенты рецепта к новому списку.
+
+        Совпадающие строки не перезаписываются. Возвращает id
+        ингредиентов, которые были удалены, изменены или добавлены.
+        """
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in ingredients
+        }
+        existing = {
+            row.ingredient_id: row
+            for row in AmountIngredient.objects.filter(recipe=recipe)
+        }
+        removed = existing.keys() - amounts.keys()
+        changed = []
+        for ingredient_id, row in existing.items():
+            amount = amounts.get(ingredient_id, row.amount)
+            if amount != row.amount:
+                row.amount = amount
+                changed.append(row)
+        added = [
+            ingredient for ingredient in ingredients
+            if ingredient['id'] not in existing
+        ]
+        if removed:
+            # Без сигналов: список покупок пересчитывается в update().
+            delete_rows(
+                AmountIngredient, AmountIngredient.objects.db,
+                id=[existing[ingredient_id].pk for ingredient_id in removed],
             )
-        AmountIngredient.objects.bulk_create(ingredient_list)
+        if changed:
+            AmountIngredient.objects.bulk_update(changed, ['amount'])
+        if added:
+            CreateRecipeSerializer.create_ingredients(recipe, added)
+        return (
+            removed
+            | {row.ingredient_id for row in changed}
+            | {ingredient['id'] for ingredient in added}
+        )
 
     @transaction.atomic
     def create(self, validated_data):
@@ -206,32 +376,58 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         tags = validated_data.pop('tags')
         ingredients = validated_data.pop('ingredients')
         instance = super().update(instance, validated_data)
-        instance.tags.clear()
         instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.create_ingredients(
+        touched = self.update_ingredients(
             recipe=instance,
             ingredients=ingredients
         )
-        instance.save()
+        if touched:
+            ShoppingListLine.objects.refresh_for_recipe(
+                instance, ingredients=touched
+            )
         return instance
 
     def to_representation(self, instance):
+        view = self.context.get('view')
+        if view is not None:
+            instance = view.get_queryset().get(pk=instance.pk)
         return RecipeReadSerializer(instance, context={
             'request': self.context.get('request')
         }).data
 
 
-class RecipeShortSerializer(serializers.ModelSerializer):
+class RecipeShortSerializer(FastRepresentationMixin,
+                            serializers.ModelSerializer):
     """Сериализатор для избранных рецептов и покупок."""
 
-    image = serializers.CharField(source='image.url')
+    image = RecipeImageField(variant='thumbnail')
 
     class Meta:
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time',)
         read_only_fields = ('id', 'name', 'image', 'cooking_time',)
 
+    def represent(self, recipe):
+        return {
+            'id': recipe.id,
+            'name': recipe.name,
+            'image': self.fields['image'].to_representation(recipe),
+            'cooking_time': recipe.cooking_time,
+        }
+
+
+class RecipeIdsSerializer(serializers.Serializer):
+    """Список id рецептов для пакетного добавления и удаления."""
+
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.RECIPE_BULK_MAX,
+    )
+
+    def validate_recipes(self, recipes):
+        return list(dict.fromkeys(recipes))
+
 
 class SubscribeListSerializer(UserSerializer):
     """Сериализатор для получения подписок."""
@@ -263,15 +459,23 @@ class SubscribeListSerializer(UserSerializer):
         return data
 
     def get_recipes_count(self, obj):
+        if getattr(obj, 'recipe_count', None) is not None:
+            return obj.recipe_count
         return obj.recipes.count()
 
     def get_recipes(self, obj):
-        request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if limit:
-            recipes = recipes[:int(limit)]
+        if hasattr(obj, 'recipes_preview'):
+            recipes = obj.recipes_preview
+        else:
+            limit = get_recipes_limit(self.context.get('request'))
+            recipes = obj.recipes.all()[:limit]
         serializer = RecipeShortSerializer(
             recipes, many=True, read_only=True
         )
         return serializer.data
+
+    def represent(self, author):
+        data = super().represent(author)
+        data['recipes'] = self.get_recipes(author)
+        data['recipes_count'] = self.get_recipes_count(author)
+        return data
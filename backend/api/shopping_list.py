@@ -0,0 +1,103 @@
+"""Потоковая выгрузка списка покупок в txt, csv и pdf."""
+import csv
+from pathlib import Path
+from tempfile import SpooledTemporaryFile
+
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen.canvas import Canvas
+
+from django.conf import settings
+
+TITLE = 'Купить в магазине:'
+CHUNK_SIZE = 64 * 1024
+PDF_FONT_SIZE = 12
+PDF_MARGIN = 50
+
+
+def _line(ingredient):
+    return (
+        f"{ingredient['ingredient__name']}"
+        f"({ingredient['ingredient__measurement_unit']}) - "
+        f"{ingredient['amount']}"
+    )
+
+
+def _buffered(parts):
+    """Склеивает мелкие куски в блоки по CHUNK_SIZE символов."""
+    buffer, size = [], 0
+    for part in parts:
+        buffer.append(part)
+        size += len(part)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def stream_txt(ingredients):
+    yield TITLE
+    for ingredient in ingredients:
+        yield '\n' + _line(ingredient)
+
+
+class _Echo:
+    """Псевдо-файл для csv.writer, возвращающий записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(ingredients):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(('Ингредиент', 'Единица измерения', 'Количество'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient__name'],
+            ingredient['ingredient__measurement_unit'],
+            ingredient['amount'],
+        ))
+
+
+def _pdf_font():
+    font_path = Path(settings.SHOPPING_LIST_PDF_FONT)
+    if not font_path.is_file():
+        return 'Helvetica'
+    if font_path.stem not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(TTFont(font_path.stem, str(font_path)))
+    return font_path.stem
+
+
+def stream_pdf(ingredients):
+    """Рисует pdf постранично во временный файл и отдаёт его блоками.
+
+    Файл держится в памяти, пока не превысит CHUNK_SIZE, дальше
+    сбрасывается на диск.
+    """
+    font = _pdf_font()
+    width, height = A4
+    with SpooledTemporaryFile(max_size=CHUNK_SIZE) as file:
+        canvas = Canvas(file, pagesize=A4)
+        lines = canvas.beginText(PDF_MARGIN, height - PDF_MARGIN)
+        lines.setFont(font, PDF_FONT_SIZE)
+        lines.textLine(TITLE)
+        for ingredient in ingredients:
+            if lines.getY() < PDF_MARGIN:
+                canvas.drawText(lines)
+                canvas.showPage()
+                lines = canvas.beginText(PDF_MARGIN, height - PDF_MARGIN)
+                lines.setFont(font, PDF_FONT_SIZE)
+            lines.textLine(_line(ingredient))
+        canvas.drawText(lines)
+        canvas.save()
+        file.seek(0)
+        yield from iter(lambda: file.read(CHUNK_SIZE), b'')
+
+
+EXPORTS = {
+    'txt': lambda ingredients: _buffered(stream_txt(ingredients)),
+    'csv': lambda ingredients: _buffered(stream_csv(ingredients)),
+    'pdf': stream_pdf,
+}
@@ -0,0 +1,70 @@
+from rest_framework.authtoken.models import Token
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from foodgram.models import AmountIngredient, Ingredient, Recipe, Tag
+from users.models import User
+
+from .authentication import token_cache
+from .cache import bump_version
+
+
+def invalidate(namespace):
+    # Версия меняется после коммита, чтобы кэш не заполнился данными
+    # из незавершённой транзакции.
+    transaction.on_commit(lambda: bump_version(namespace))
+
+
+def invalidate_recipes():
+    invalidate('recipes')
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def invalidate_tags(**kwargs):
+    invalidate('tags')
+    invalidate_recipes()
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredients(**kwargs):
+    invalidate('ingredients')
+    invalidate_recipes()
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+@receiver((post_save, post_delete), sender=AmountIngredient)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def invalidate_recipe(**kwargs):
+    invalidate_recipes()
+
+
+@receiver(post_save, sender=User)
+def invalidate_author(update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    invalidate_recipes()
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_author(**kwargs):
+    # Recipe.author обнуляется через SET_NULL одним UPDATE без сигналов
+    # рецепта, иначе лента продолжала бы отдавать удалённого автора.
+    invalidate_recipes()
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token(instance, **kwargs):
+    transaction.on_commit(lambda: token_cache.invalidate([instance.key]))
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_tokens(instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    keys = list(
+        Token.objects.filter(user=instance).values_list('key', flat=True)
+    )
+    if keys:
+        transaction.on_commit(lambda: token_cache.invalidate(keys))
@@ -0,0 +1,323 @@
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from unittest import skipUnless
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient, APITestCase
+
+from django.db import connection, connections
+from django.test import TransactionTestCase, override_settings
+
+from api.cache import get_version
+from api.metrics import registry
+from foodgram.management.commands import bench_serializers
+from foodgram.management.commands._benchmark import NO_CACHE, seed
+from foodgram.models import Ingredient, Recipe, Tag
+from users.models import Follow, User
+
+
+@override_settings(CACHES=NO_CACHE)
+class RecipeListQueriesTest(APITestCase):
+    """Число запросов ленты не зависит от размера страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user_ids, _ = seed(users=5, recipes=30, ingredients=20)
+        cls.user = User.objects.get(pk=user_ids[0])
+
+    def assert_page_queries(self, queries):
+        for limit in (2, 12):
+            with self.subTest(limit=limit), self.assertNumQueries(queries):
+                response = self.client.get('/api/recipes/', {'limit': limit})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), limit)
+
+    def test_anonymous(self):
+        # count, страница с авторами, теги, ингредиенты.
+        self.assert_page_queries(4)
+
+    def test_authenticated(self):
+        # count и страница с флагами, фрагменты рецептов (кэш отключён)
+        # тремя запросами, подписки на авторов страницы.
+        self.client.force_authenticate(self.user)
+        self.assert_page_queries(6)
+
+
+@override_settings(CACHES=NO_CACHE)
+class SubscriptionsQueriesTest(APITestCase):
+    """Число запросов подписок не зависит от числа авторов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user_ids, _ = seed(
+            users=13, recipes=60, ingredients=20, follows_per_user=0
+        )
+        cls.user = User.objects.get(pk=user_ids[0])
+        cls.authors = user_ids[1:]
+
+    def assert_page_queries(self, params, queries):
+        self.client.force_authenticate(self.user)
+        for count in (3, 12):
+            Follow.objects.filter(user=self.user).delete()
+            Follow.objects.bulk_create(
+                Follow(user=self.user, author_id=author_id)
+                for author_id in self.authors[:count]
+            )
+            with self.subTest(authors=count), self.assertNumQueries(queries):
+                response = self.client.get(
+                    '/api/users/subscriptions/', {'limit': 20, **params}
+                )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.data['results']), count)
+
+    # count, страница авторов, рецепты всех авторов страницы.
+    def test_recipes_limit(self):
+        self.assert_page_queries({'recipes_limit': 2}, 3)
+
+    def test_all_recipes(self):
+        self.assert_page_queries({}, 3)
+
+
+@skipUnless(
+    connection.vendor == 'postgresql', 'гонки проверяются на PostgreSQL'
+)
+class ToggleConcurrencyTest(TransactionTestCase):
+    """Параллельные нажатия избранного и корзины из пула потоков."""
+
+    workers = 12
+
+    def setUp(self):
+        user_ids, recipe_ids = seed(
+            users=self.workers, recipes=3, ingredients=10,
+            follows_per_user=0, favorites_per_user=0, carts_per_user=0,
+        )
+        self.users = list(User.objects.filter(pk__in=user_ids))
+        self.recipe_ids = recipe_ids
+        self.recipe = Recipe.objects.get(pk=recipe_ids[0])
+
+    def send_all(self, requests):
+        """Одновременно выполняет запросы (user, method, url, data)."""
+        barrier = threading.Barrier(len(requests))
+
+        def send(request):
+            user, method, url, data = request
+            client = APIClient()
+            client.force_authenticate(user)
+            try:
+                barrier.wait()
+                return getattr(client, method)(url, data, format='json')
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(len(requests)) as pool:
+            return list(pool.map(send, requests))
+
+    def fire(self, method, url, users):
+        return Counter(
+            response.status_code for response in self.send_all(
+                [(user, method, url, None) for user in users]
+            )
+        )
+
+    def assert_counter(self, field, value):
+        self.recipe.refresh_from_db()
+        self.assertEqual(getattr(self.recipe, field), value)
+
+    def test_same_user(self):
+        """Из одновременных нажатий одного пользователя проходит одно."""
+        same_user = [self.users[0]] * self.workers
+        for kind, field in (
+            ('favorite', 'favorites_count'),
+            ('shopping_cart', 'carts_count'),
+        ):
+            url = f'/api/recipes/{self.recipe.pk}/{kind}/'
+            with self.subTest(kind):
+                self.assertEqual(
+                    self.fire('post', url, same_user),
+                    Counter({201: 1, 400: self.workers - 1}),
+                )
+                self.assert_counter(field, 1)
+                self.assertEqual(
+                    self.fire('delete', url, same_user),
+                    Counter({204: 1, 400: self.workers - 1}),
+                )
+                self.assert_counter(field, 0)
+
+    def test_many_users(self):
+        """Разные пользователи одновременно не теряют прибавки."""
+        for kind, field in (
+            ('favorite', 'favorites_count'),
+            ('shopping_cart', 'carts_count'),
+        ):
+            url = f'/api/recipes/{self.recipe.pk}/{kind}/'
+            with self.subTest(kind):
+                self.assertEqual(
+                    self.fire('post', url, self.users),
+                    Counter({201: self.workers}),
+                )
+                self.assert_counter(field, self.workers)
+                self.assertEqual(
+                    self.fire('delete', url, self.users),
+                    Counter({204: self.workers}),
+                )
+                self.assert_counter(field, 0)
+
+    def test_bulk_and_single(self):
+        """Пакетные и одиночные запросы меняют счётчик один раз."""
+        user = self.users[0]
+        for kind, field in (
+            ('favorite', 'favorites_count'),
+            ('shopping_cart', 'carts_count'),
+        ):
+            single = f'/api/recipes/{self.recipe.pk}/{kind}/'
+            bulk = (f'/api/recipes/{kind}/', {'recipes': self.recipe_ids})
+            for method, status, counter in (
+                ('post', 'added', 1), ('delete', 'removed', 0),
+            ):
+                with self.subTest(kind=kind, method=method):
+                    responses = self.send_all([
+                        (user, method, *bulk) if number % 2
+                        else (user, method, single, None)
+                        for number in range(self.workers)
+                    ])
+                    changed = [
+                        response.status_code for response in responses
+                        if response.status_code in (201, 204)
+                    ] + [
+                        result['status'] for response in responses
+                        if response.status_code == 200
+                        for result in response.data['results']
+                        if result['id'] == self.recipe.pk
+                        and result['status'] == status
+                    ]
+                    self.assertEqual(len(changed), 1, changed)
+                    self.assert_counter(field, counter)
+
+
+class SerializerEquivalenceTest(APITestCase):
+    """Быстрый путь сериализации совпадает с обычным побайтно."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user_ids, recipe_ids = seed(users=10, recipes=40, ingredients=30)
+        cls.orphan = recipe_ids[0]
+        bench_serializers.orphan_recipe(cls.orphan)
+        cls.user = User.objects.get(pk=user_ids[0])
+
+    def test_byte_identical(self):
+        renderer = JSONRenderer()
+        for name, serializer_class, objects, context in (
+            bench_serializers.Command().cases(self.user)
+        ):
+            def render():
+                return renderer.render(serializer_class(
+                    objects, many=True, context=context
+                ).data)
+
+            with self.subTest(name):
+                with bench_serializers.reference_serialization():
+                    expected = render()
+                self.assertEqual(render(), expected)
+
+    def test_recipe_without_author(self):
+        for user in (None, self.user):
+            self.client.force_authenticate(user)
+            for url, params in (
+                ('/api/recipes/', {'limit': 50}),
+                ('/api/recipes/', {'limit': 50, 'fields': 'id,author'}),
+                (f'/api/recipes/{self.orphan}/', {}),
+            ):
+                with self.subTest(user=user, url=url, params=params):
+                    response = self.client.get(url, params)
+                    self.assertEqual(response.status_code, 200)
+                    recipes = response.data.get('results', [response.data])
+                    orphan = next(
+                        recipe for recipe in recipes
+                        if recipe['id'] == self.orphan
+                    )
+                    self.assertIsNone(orphan['author'])
+
+
+class CacheInvalidationTest(APITestCase):
+    """Версии кэша меняются только после коммита изменений."""
+
+    def test_versions_bumped_on_commit(self):
+        for namespace, create in (
+            ('tags', lambda: Tag.objects.create(
+                name='завтрак', color='#E26C2D', slug='breakfast'
+            )),
+            ('ingredients', lambda: Ingredient.objects.create(
+                name='соль', measurement_unit='г'
+            )),
+        ):
+            with self.subTest(namespace):
+                before = get_version(namespace)['version']
+                with self.captureOnCommitCallbacks(execute=True):
+                    create()
+                    self.assertEqual(
+                        get_version(namespace)['version'], before
+                    )
+                self.assertNotEqual(get_version(namespace)['version'], before)
+
+    def test_cached_feed_headers(self):
+        seed(users=2, recipes=5, ingredients=10)
+        response = self.client.get('/api/recipes/')
+        revalidated = self.client.get(
+            '/api/recipes/', HTTP_IF_NONE_MATCH=response['ETag']
+        )
+        self.assertEqual(revalidated.status_code, 304)
+        for current in (response, revalidated):
+            with self.subTest(status=current.status_code):
+                self.assertIn('Authorization', current['Vary'])
+                self.assertEqual(current['Cache-Control'], 'no-cache')
+
+    def test_deleted_author(self):
+        user_ids, _ = seed(users=5, recipes=20, ingredients=10)
+        viewer = User.objects.get(pk=user_ids[0])
+        author = Recipe.objects.exclude(author=viewer).values_list(
+            'author', flat=True
+        ).first()
+        authored = set(
+            Recipe.objects.filter(author=author).values_list('id', flat=True)
+        )
+        for user in (None, viewer):
+            self.client.force_authenticate(user)
+            self.client.get('/api/recipes/', {'limit': 50})
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(pk=author).delete()
+        for user in (None, viewer):
+            self.client.force_authenticate(user)
+            with self.subTest(user=user):
+                response = self.client.get('/api/recipes/', {'limit': 50})
+                self.assertEqual(
+                    [
+                        recipe['author'] for recipe in response.data['results']
+                        if recipe['id'] in authored
+                    ],
+                    [None] * len(authored),
+                )
+
+
+@override_settings(CACHES=NO_CACHE, METRICS_ENABLED=True)
+class MetricsTest(APITestCase):
+    """Метрики разделяют время сериализации и рендеринга."""
+
+    def test_serialization_measured(self):
+        seed(users=2, recipes=10, ingredients=10)
+        labels = ('recipes-list', 'GET')
+        histograms = {
+            name: registry.histograms[name] for name in (
+                'foodgram_serialize_duration_seconds',
+                'foodgram_render_duration_seconds',
+            )
+        }
+        before = {
+            name: histograms[name][labels].sum
+            if labels in histograms[name] else 0
+            for name in histograms
+        }
+        self.client.get('/api/recipes/')
+        for name, values in histograms.items():
+            with self.subTest(name):
+                self.assertGreater(values[labels].sum, before[name])
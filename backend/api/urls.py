@@ -1,8 +1,11 @@
 from rest_framework.routers import DefaultRouter
 
+from django.conf import settings
 from django.urls import include, path
 
-from .views import IngredientViewSet, RecipeViewSet, TagViewSet, UserViewSet
+from .async_views import ASYNC_ROUTES, async_view
+from .views import (CacheStatsView, IngredientViewSet, MetricsView,
+                    RecipeViewSet, TagViewSet, UserViewSet)
 
 app_name = 'api'
 
@@ -12,9 +15,16 @@ router.register('tags', TagViewSet, basename='tags')
 router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('users', UserViewSet, basename='users')
 
+router_urls = router.urls
+if settings.ASYNC_VIEWS:
+    for pattern in router_urls:
+        if pattern.name in ASYNC_ROUTES:
+            pattern.callback = async_view(pattern.callback)
 
 urlpatterns = [
-    path('', include(router.urls)),
+    path('cache/stats/', CacheStatsView.as_view(), name='cache-stats'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('', include(router_urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
 ]
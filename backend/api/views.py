@@ -1,53 +1,249 @@
+import hashlib
+from collections import defaultdict
+from operator import itemgetter
+
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import (IsAuthenticated,
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import (IsAdminUser, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from django.db.models import Count, Sum
-from django.http.response import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (BooleanField, Count, Exists, F, OuterRef,
+                              Prefetch, Value, Window)
+from django.db.models.functions import RowNumber
+from django.http import Http404
+from django.http.response import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import quote_etag
 
 from foodgram.models import (AmountIngredient, Carts, Favorited, Ingredient,
-                             Recipe, Tag)
+                             Recipe, ShoppingListLine, Tag)
+from foodgram.search import ingredient_index
 from users.models import Follow, User
 
+from .cache import CachedResponseMixin, cached_fragments, get_stats
+from .fieldsets import SparseFieldsetMixin, ids, pick
 from .filters import IngredientFilter, RecipeFilter
+from .metrics import registry
 from .pagination import CustomPagination
-from .permissions import IsAdminOrReadOnly, IsAuthorOrAdminOrReadOnly
+from .permissions import (IsAdminOrReadOnly, IsAuthorOrAdminOrReadOnly,
+                          IsStaffOrMetricsIP)
+from .renderers import (CsvShoppingListRenderer, FastJSONRenderer,
+                        PdfShoppingListRenderer, TxtShoppingListRenderer)
 from .serializers import (CreateRecipeSerializer, IngredientSerializer,
-                          RecipeReadSerializer, RecipeShortSerializer,
-                          SubscribeListSerializer, TagSerializer,
-                          UserSerializer)
+                          RecipeIdsSerializer, RecipeReadSerializer,
+                          RecipeShortSerializer, SubscribeListSerializer,
+                          TagSerializer, UserSerializer, get_recipes_limit)
+from .shopping_list import EXPORTS
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """Вывод ингредиетов."""
 
+    cache_namespace = 'ingredients'
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,)
     filterset_class = IngredientFilter
     search_fields = ('^name',)
 
+    @action(detail=False, pagination_class=None, filter_backends=[])
+    def autocomplete(self, request):
+        """Подсказки по началу названия из индекса в памяти процесса."""
+        prefix = request.query_params.get('name', '')
+        try:
+            limit = int(request.query_params.get(
+                'limit', settings.INGREDIENT_AUTOCOMPLETE_LIMIT
+            ))
+        except ValueError:
+            raise ValidationError({'limit': 'Ожидается целое число.'})
+        limit = max(1, min(limit, settings.INGREDIENT_AUTOCOMPLETE_MAX_LIMIT))
+        etag = quote_etag(hashlib.md5(
+            f'{ingredient_index.digest}:{limit}:{prefix}'.encode()
+        ).hexdigest())
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = Response(ingredient_index.search(prefix, limit))
+        response['ETag'] = etag
+        patch_cache_control(
+            response, max_age=settings.INGREDIENT_AUTOCOMPLETE_MAX_AGE
+        )
+        return response
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+
+class TagViewSet(CachedResponseMixin, viewsets.ReadOnlyModelViewSet):
     """Вывод тегов."""
 
+    cache_namespace = 'tags'
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
     permission_classes = (IsAdminOrReadOnly,)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class CacheStatsView(APIView):
+    """Попадания и промахи кэша справочников."""
+
+    permission_classes = (IsAdminUser,)
+
+    @staticmethod
+    def get_namespaces():
+        return (
+            IngredientViewSet.cache_namespace,
+            TagViewSet.cache_namespace,
+            RecipeViewSet.cache_namespace,
+            f'{RecipeViewSet.cache_namespace}-fragments',
+        )
+
+    def get(self, request):
+        return Response(get_stats(self.get_namespaces()))
+
+
+class MetricsView(APIView):
+    """Метрики запросов и кэша в текстовом формате Prometheus."""
+
+    permission_classes = (IsStaffOrMetricsIP,)
+
+    def get(self, request):
+        lines = registry.render()
+        stats = get_stats(CacheStatsView.get_namespaces())
+        for outcome in ('hits', 'misses'):
+            name = f'foodgram_cache_{outcome}_total'
+            lines.append(f'# TYPE {name} counter')
+            lines.extend(
+                f'{name}{{namespace="{namespace}"}} {values[outcome]}'
+                for namespace, values in stats.items()
+            )
+        return HttpResponse(
+            '\n'.join(lines) + '\n',
+            content_type='text/plain; version=0.0.4; charset=utf-8',
+        )
+
+
+class RecipeViewSet(SparseFieldsetMixin, CachedResponseMixin,
+                    viewsets.ModelViewSet):
     """Создание/отображение рецептов."""
 
-    queryset = Recipe.objects.order_by('-pub_date')
+    cache_namespace = 'recipes'
+    collapsed_fields = {
+        'author': itemgetter('id'),
+        'tags': ids,
+        'ingredients': pick('id', 'amount'),
+    }
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
     pagination_class = CustomPagination
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        """Рецепты с данными для страницы за постоянное число запросов.
+
+        Флаги пользователя считаются подзапросами Exists, теги и
+        ингредиенты подгружаются одним запросом на всю страницу.
+        Список для авторизованного пользователя берёт их из кэша
+        фрагментов, поэтому здесь остаются только флаги.
+        """
+        user = self.request.user
+        queryset = Recipe.objects.order_by('-pub_date', '-id')
+        if user.is_anonymous:
+            return self.prefetch_details(queryset).select_related('author')
+        queryset = queryset.annotate(
+            is_favorited=Exists(Favorited.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(Carts.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+        )
+        if self.action == 'list':
+            return queryset
+        return self.prefetch_details(queryset).prefetch_related(
+            Prefetch(
+                'author',
+                queryset=User.objects.annotate(is_subscribed=Exists(
+                    Follow.objects.filter(user=user, author=OuterRef('pk'))
+                )),
+            )
+        )
+
+    @staticmethod
+    def prefetch_details(queryset):
+        return queryset.prefetch_related(
+            'tags',
+            Prefetch(
+                'ingredient_to_recipes',
+                queryset=AmountIngredient.objects.select_related(
+                    'ingredient'
+                ).order_by('ingredient__name'),
+            ),
+        )
+
+    def use_cache(self, request):
+        # Анонимная выдача одинакова для всех посетителей. Порядок по
+        # популярности меняется с каждым добавлением в избранное.
+        return (
+            request.user.is_anonymous
+            and request.query_params.get('ordering') != 'popular'
+        )
+
+    def list(self, request, *args, **kwargs):
+        """Лента рецептов.
+
+        Анонимам отдаётся закэшированная страница целиком. Для
+        пользователя общие части рецептов берутся из кэша фрагментов,
+        а его флаги приходят из запроса страницы и одного запроса
+        подписок.
+        """
+        if request.user.is_anonymous:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(self.personalize(list(queryset)))
+        return self.get_paginated_response(self.personalize(page))
+
+    def personalize(self, recipes):
+        fragments = cached_fragments(
+            self.cache_namespace,
+            [recipe.pk for recipe in recipes],
+            self.build_fragments,
+        )
+        subscribed = set(Follow.objects.filter(
+            user=self.request.user,
+            author__in={recipe.author_id for recipe in recipes},
+        ).values_list('author', flat=True))
+        data = []
+        for recipe in recipes:
+            item = dict(fragments[recipe.pk])
+            # Автор мог удалить аккаунт, рецепт тогда остаётся без него.
+            if item['author'] is not None:
+                item['author'] = dict(
+                    item['author'],
+                    is_subscribed=recipe.author_id in subscribed,
+                )
+            item['is_favorited'] = recipe.is_favorited
+            item['is_in_shopping_cart'] = recipe.is_in_shopping_cart
+            data.append(item)
+        return data
+
+    def build_fragments(self, ids):
+        """Сериализует рецепты без данных о текущем пользователе."""
+        recipes = list(self.prefetch_details(
+            Recipe.objects.filter(pk__in=ids).select_related('author')
+        ))
+        for recipe in recipes:
+            recipe.is_favorited = recipe.is_in_shopping_cart = False
+            if recipe.author is not None:
+                recipe.author.is_subscribed = False
+        serializer = RecipeReadSerializer(
+            recipes, many=True, context=self.get_serializer_context()
+        )
+        return {item['id']: item for item in serializer.data}
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
@@ -57,28 +253,40 @@ class RecipeViewSet(viewsets.ModelViewSet):
         return CreateRecipeSerializer
 
     @staticmethod
-    def send_message(ingredients):
-        shopping_list = 'Купить в магазине:'
-        for ingredient in ingredients:
-            shopping_list += (
-                f"\n{ingredient['ingredient__name']}"
-                f"({ingredient['ingredient__measurement_unit']}) - "
-                f"{ingredient['amount']}"
-            )
-        file = 'shopping_list.txt'
-        response = HttpResponse(shopping_list, content_type='text/plain')
-        response['Content-Disposition'] = f'attachment; filename="{file}.txt"'
+    def send_message(ingredients, renderer):
+        """Отдаёт список покупок потоком в формате выбранного рендерера."""
+        if renderer.format not in EXPORTS:
+            renderer = TxtShoppingListRenderer()
+        response = StreamingHttpResponse(
+            EXPORTS[renderer.format](ingredients),
+            content_type=renderer.media_type,
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{renderer.format}"'
+        )
         return response
 
-    @action(detail=False, methods=['GET'],
-            permission_classes=[IsAuthenticated])
+    @action(
+        detail=False,
+        methods=['GET'],
+        permission_classes=[IsAuthenticated],
+        renderer_classes=[
+            TxtShoppingListRenderer,
+            CsvShoppingListRenderer,
+            PdfShoppingListRenderer,
+            FastJSONRenderer,
+        ]
+    )
     def download_shopping_cart(self, request):
-        ingredients = AmountIngredient.objects.filter(
-            recipe__shopping_cart__user=request.user
+        ingredients = ShoppingListLine.objects.filter(
+            user=request.user
         ).order_by('ingredient__name').values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-        return self.send_message(ingredients)
+            'ingredient__name', 'ingredient__measurement_unit',
+            amount=F('total_amount'),
+        )
+        return self.send_message(
+            ingredients.iterator(), request.accepted_renderer
+        )
 
     @action(
         detail=True,
@@ -103,27 +311,97 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return self.delete_from(Carts, request.user, pk)
         return None
 
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='favorite',
+        url_name='favorite-bulk',
+        permission_classes=[IsAuthenticated]
+    )
+    def favorite_bulk(self, request):
+        return self.bulk_toggle(Favorited, request)
+
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart',
+        url_name='shopping-cart-bulk',
+        permission_classes=[IsAuthenticated]
+    )
+    def shopping_cart_bulk(self, request):
+        return self.bulk_toggle(Carts, request)
+
+    @transaction.atomic
+    def bulk_toggle(self, model, request):
+        """Пакетное добавление и удаление с результатом по каждому id.
+
+        Список id передаётся в теле запроса, для DELETE можно и
+        параметрами ?recipes=1&recipes=2.
+        """
+        data = request.data
+        if not data and request.method == 'DELETE':
+            data = {'recipes': request.query_params.getlist('recipes')}
+        serializer = RecipeIdsSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data['recipes']
+        user = request.user
+        if request.method == 'POST':
+            recipes, changed = model.objects.add_many(user, ids)
+            results = [
+                {'id': pk, 'status': 'not_found'} if pk not in recipes
+                else {'id': pk, 'status': 'exists'} if pk not in changed
+                else {
+                    'id': pk, 'status': 'added',
+                    'recipe': RecipeShortSerializer(recipes[pk]).data,
+                }
+                for pk in ids
+            ]
+        else:
+            changed = model.objects.remove_many(user, ids)
+            results = [
+                {'id': pk, 'status': 'removed' if pk in changed else 'absent'}
+                for pk in ids
+            ]
+        if model is Carts and changed:
+            ShoppingListLine.objects.refresh(
+                [user.pk],
+                AmountIngredient.objects.filter(
+                    recipe__in=changed
+                ).values_list('ingredient', flat=True),
+            )
+        return Response({'results': results})
+
+    @transaction.atomic
     def add_to(self, model, user, pk):
-        if model.objects.filter(user=user, recipe__id=pk).exists():
+        recipe, created = model.objects.add(user, pk)
+        if recipe is None:
+            raise Http404
+        if not created:
             return Response({'errors': 'Рецепт уже добавлен!'},
                             status=status.HTTP_400_BAD_REQUEST)
-        recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
+        if model is Carts:
+            ShoppingListLine.objects.refresh_for_recipe(
+                recipe.pk, users=[user.pk]
+            )
         serializer = RecipeShortSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @transaction.atomic
     def delete_from(self, model, user, pk):
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        if obj.exists():
-            obj.delete()
+        if model.objects.remove(user, pk):
+            if model is Carts:
+                ShoppingListLine.objects.refresh_for_recipe(
+                    pk, users=[user.pk]
+                )
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({'errors': 'Рецепт уже удален!'},
                         status=status.HTTP_400_BAD_REQUEST)
 
 
-class UserViewSet(UserViewSet):
+class UserViewSet(SparseFieldsetMixin, UserViewSet):
     """Класс отображения данных пользователя."""
 
+    collapsed_fields = {'recipes': ids}
     queryset = User.objects.all()
     serializer_class = UserSerializer
     pagination_class = CustomPagination
@@ -162,9 +440,44 @@ class UserViewSet(UserViewSet):
     def subscriptions(self, request):
         user = request.user
         queryset = (User.objects.filter(following__user=user)
-                    .annotate(recipe_count=Count('recipes')))
+                    .annotate(recipe_count=Count('recipes'),
+                              is_subscribed=Value(True, BooleanField()))
+                    .order_by('username', 'id'))
         pages = self.paginate_queryset(queryset)
+        self.attach_recipes(pages, get_recipes_limit(request))
         serializer = SubscribeListSerializer(
             pages, many=True, context={'request': request}
         )
         return self.get_paginated_response(serializer.data)
+
+    @staticmethod
+    def attach_recipes(authors, limit):
+        """Подгружает последние рецепты всех авторов страницы одним запросом.
+
+        С ограничением рецепты нумеруются ROW_NUMBER() в разрезе автора,
+        и из базы возвращаются только первые limit рецептов каждого.
+        """
+        authors = list(authors or ())
+        if not authors:
+            return
+        recipes = Recipe.objects.filter(author__in=authors)
+        if limit is not None:
+            ranked = recipes.annotate(recipe_rank=Window(
+                RowNumber(),
+                partition_by=F('author'),
+                order_by=(F('pub_date').desc(), F('id').desc()),
+            ))
+            sql, params = ranked.query.sql_with_params()
+            recipes = Recipe.objects.raw(
+                f'SELECT * FROM ({sql}) ranked '
+                'WHERE ranked.recipe_rank <= %s '
+                'ORDER BY ranked.recipe_rank',
+                (*params, limit),
+            )
+        else:
+            recipes = recipes.order_by('-pub_date', '-id')
+        by_author = defaultdict(list)
+        for recipe in recipes:
+            by_author[recipe.author_id].append(recipe)
+        for author in authors:
+            author.recipes_preview = by_author[author.id]
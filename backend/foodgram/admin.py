@@ -46,8 +46,9 @@ class RecipeAdmin(admin.ModelAdmin):
         return qs
 
     def get_favorited(self, obj):
-        return obj.favorited.count()
+        return obj.favorites_count
     get_favorited.short_description = 'Избранное'
+    get_favorited.admin_order_field = 'favorites_count'
 
     def get_ingredients(self, obj):
         return ', '.join([
@@ -0,0 +1,42 @@
+"""Денормализованные счётчики популярности рецептов."""
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Carts, Favorited, Recipe
+
+COUNTERS = {model: model.counter_field for model in (Favorited, Carts)}
+
+
+def live_count(model):
+    """Подзапрос с настоящим числом строк model для рецепта."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(recipe=OuterRef('pk')).order_by().values(
+                'recipe'
+            ).annotate(total=Count('pk')).values('total'),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+
+def stale_recipes():
+    """Рецепты, у которых счётчик разошёлся с таблицей."""
+    annotations = {
+        f'live_{field}': live_count(model)
+        for model, field in COUNTERS.items()
+    }
+    mismatch = Q()
+    for field in COUNTERS.values():
+        mismatch |= ~Q(**{field: F(f'live_{field}')})
+    return Recipe.objects.annotate(**annotations).filter(mismatch)
+
+
+def reconcile():
+    """Пересчитывает расходящиеся счётчики, возвращает число рецептов."""
+    stale = list(stale_recipes().values_list('pk', flat=True))
+    if stale:
+        Recipe.objects.filter(pk__in=stale).update(**{
+            field: live_count(model) for model, field in COUNTERS.items()
+        })
+    return len(stale)
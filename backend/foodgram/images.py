@@ -0,0 +1,106 @@
+"""Фоновая подготовка уменьшенных копий изображений рецептов."""
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from PIL import Image, ImageOps, features
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+
+from .storage import is_recent
+
+logger = logging.getLogger(__name__)
+
+IMAGE_FORMAT, IMAGE_EXTENSION = (
+    ('WEBP', 'webp') if features.check('webp') else ('JPEG', 'jpg')
+)
+
+_executor = None
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.RECIPE_IMAGE_WORKERS,
+            thread_name_prefix='recipe-images',
+        )
+    return _executor
+
+
+def schedule_variants(recipe):
+    """Ставит подготовку копий в очередь после коммита транзакции."""
+    args = (recipe.pk, recipe.image.name)
+    if settings.RECIPE_IMAGE_WORKERS:
+        transaction.on_commit(lambda: get_executor().submit(run, *args))
+    else:
+        transaction.on_commit(lambda: make_variants(*args))
+
+
+def run(pk, name):
+    # Потоку пула нужны свои соединения с базой.
+    close_old_connections()
+    try:
+        make_variants(pk, name)
+    except Exception:
+        logger.exception('Не удалось подготовить изображение %s', name)
+    finally:
+        close_old_connections()
+
+
+def release_image(name):
+    """Удаляет файл после коммита, если на него не ссылаются рецепты.
+
+    Недавно записанные или повторно загруженные файлы остаются
+    команде collect_media: ссылка на них может быть ещё не закоммичена.
+    """
+    from .models import Recipe
+
+    def delete():
+        if (
+            Recipe.objects.filter(image=name).exists()
+            or not default_storage.exists(name)
+            or is_recent(default_storage, name)
+        ):
+            return
+        default_storage.delete(name)
+
+    if name:
+        transaction.on_commit(delete)
+
+
+def render_variant(image, size):
+    variant = image.copy()
+    variant.thumbnail(size, Image.LANCZOS)
+    if variant.mode not in ('RGB', 'RGBA') or IMAGE_FORMAT == 'JPEG':
+        variant = variant.convert('RGB')
+    buffer = BytesIO()
+    variant.save(
+        buffer, IMAGE_FORMAT,
+        quality=settings.RECIPE_IMAGE_QUALITY, optimize=True,
+    )
+    return buffer.getvalue()
+
+
+def make_variants(pk, name):
+    """Сохраняет копии изображения и записывает их в image_variants."""
+    from .models import Recipe
+
+    with default_storage.open(name) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+    variants = {'source': name}
+    for variant, size in settings.RECIPE_IMAGE_VARIANTS.items():
+        variants[variant] = default_storage.save(
+            f'foodgram/variants/{variant}.{IMAGE_EXTENSION}',
+            ContentFile(render_variant(image, size)),
+        )
+    recipe = Recipe.objects.filter(pk=pk).first()
+    # Пока шла обработка, картинку рецепта могли заменить.
+    if recipe is None or recipe.image.name != name:
+        return
+    recipe.image_variants = variants
+    recipe.save(update_fields=['image_variants'])
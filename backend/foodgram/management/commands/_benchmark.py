@@ -0,0 +1,302 @@
+"""Общие инструменты команд замера производительности."""
+import http.client
+import math
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import Client
+
+from api.metrics import QueryCounter
+from foodgram.counters import reconcile
+from foodgram.models import (AmountIngredient, Carts, Favorited, Ingredient,
+                             Recipe, ShoppingListLine, Tag)
+from users.models import Follow, User
+
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = max(math.ceil(percent / 100 * len(ordered)) - 1, 0)
+    return ordered[index]
+
+
+def summarize(timings):
+    """Сводка по замерам в миллисекундах."""
+    return {
+        'runs': len(timings),
+        'mean_ms': round(statistics.mean(timings), 3),
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+    }
+
+
+def measure(func, args_list, warmup=3):
+    """Вызывает func для каждого набора аргументов и замеряет время."""
+    for args in args_list[:warmup]:
+        func(*args)
+    timings = []
+    for args in args_list:
+        start = time.perf_counter()
+        func(*args)
+        timings.append((time.perf_counter() - start) * 1000)
+    return summarize(timings)
+
+
+def profile(func, args_list, warmup=3):
+    """Как measure, но ещё считает SQL-запросы и пропускную способность.
+
+    func должна вернуть ответ тестового клиента, коды 4xx и 5xx
+    считаются ошибкой замера.
+    """
+    for args in args_list[:warmup]:
+        func(*args)
+    timings, queries = [], []
+    for args in args_list:
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            start = time.perf_counter()
+            response = func(*args)
+            timings.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 400:
+            raise CommandError(
+                f'Ответ {response.status_code}: {response.content[:200]!r}'
+            )
+        queries.append(counter.count)
+    stats = summarize(timings)
+    stats['rps'] = round(len(timings) / sum(timings) * 1000, 1)
+    stats['queries_min'] = min(queries)
+    stats['queries_max'] = max(queries)
+    return stats
+
+
+def api_client(**defaults):
+    """Тестовый клиент с хостом из ALLOWED_HOSTS."""
+    host = settings.ALLOWED_HOSTS[0]
+    return Client(HTTP_HOST='localhost' if host == '*' else host, **defaults)
+
+
+def format_stats(name, stats):
+    return (
+        f"{name:<40} p50 {stats['p50_ms']:>9.3f} ms  "
+        f"p95 {stats['p95_ms']:>9.3f} ms  p99 {stats['p99_ms']:>9.3f} ms"
+    )
+
+
+@contextmanager
+def temporary_database(verbosity=0):
+    """Пустая тестовая база на время замеров, рабочая база не меняется."""
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def http_get(port, path, token=None, timeout=30):
+    """Запрос GET к запущенному серверу, возвращает код ответа."""
+    client = http.client.HTTPConnection('127.0.0.1', port, timeout=timeout)
+    headers = {'Authorization': f'Token {token}'} if token else {}
+    try:
+        client.request('GET', path, headers=headers)
+        response = client.getresponse()
+        response.read()
+        return response.status
+    finally:
+        client.close()
+
+
+@contextmanager
+def gunicorn(app, port, overrides, ready_path='/api/tags/', timeout=30):
+    """Запускает gunicorn с настройками gunicorn_conf поверх временной базы.
+
+    Сервер получает базу, открытую сейчас в connection, через те же
+    переменные окружения, что и в боевых настройках.
+    """
+    database = connection.settings_dict
+    env = {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': 'foodgram_backend.settings',
+        'GUNICORN_BIND': f'127.0.0.1:{port}',
+        'ALLOWED_HOSTS': '127.0.0.1',
+        'POSTGRES_DB': database['NAME'],
+        # Перезапуск воркера оборвал бы соединения посреди замера.
+        'GUNICORN_MAX_REQUESTS': '0',
+        **overrides,
+    }
+    for key, variable in (
+        ('USER', 'POSTGRES_USER'), ('PASSWORD', 'POSTGRES_PASSWORD'),
+        ('HOST', 'DB_HOST'), ('PORT', 'DB_PORT'),
+    ):
+        if database[key]:
+            env[variable] = str(database[key])
+    env.pop('DB_ENGINE', None)
+    server = subprocess.Popen(
+        (
+            sys.executable, '-m', 'gunicorn',
+            '-c', 'python:foodgram_backend.gunicorn_conf', app,
+        ),
+        cwd=settings.BASE_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if server.poll() is not None:
+                raise CommandError('gunicorn завершился при запуске')
+            try:
+                if http_get(port, ready_path) == 200:
+                    break
+            except OSError:
+                pass
+            if time.monotonic() > deadline:
+                raise CommandError('gunicorn не ответил за отведённое время')
+            time.sleep(0.2)
+        yield server
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+@contextmanager
+def _explicit_pub_date():
+    field = Recipe._meta.get_field('pub_date')
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = True
+
+
+def seed(users=50, recipes=1000, tags=3, ingredients=2000,
+         ingredients_per_recipe=8, follows_per_user=10,
+         favorites_per_user=20, carts_per_user=10, random_seed=0,
+         batch_size=1000):
+    """Заполняет пустую базу синтетическими данными пачками bulk_create.
+
+    Даты публикации распределены по последним трём годам, чтобы
+    сортировка по дате не вырождалась в сортировку по id.
+    """
+    rng = random.Random(random_seed)
+    Tag.objects.bulk_create(
+        Tag(name=f'Тэг {i}', color=f'#{i:06X}', slug=f'tag-{i}')
+        for i in range(tags)
+    )
+    tag_ids = list(Tag.objects.values_list('id', flat=True))
+    Ingredient.objects.bulk_create(
+        (
+            Ingredient(name=f'ингредиент {i}', measurement_unit='г')
+            for i in range(ingredients)
+        ),
+        batch_size=batch_size,
+    )
+    ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+    password = make_password(None)
+    User.objects.bulk_create(
+        (
+            User(
+                email=f'user{i}@bench.local', username=f'user{i}',
+                first_name='Имя', last_name='Фамилия', password=password,
+            )
+            for i in range(users)
+        ),
+        batch_size=batch_size,
+    )
+    user_ids = list(User.objects.values_list('id', flat=True))
+    today = date.today()
+    with _explicit_pub_date():
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    name=f'Рецепт {i}',
+                    author_id=rng.choice(user_ids),
+                    pub_date=today - timedelta(days=rng.randrange(1095)),
+                    image='foodgram/bench.png',
+                    text='Описание рецепта. ' * 20,
+                    cooking_time=rng.randint(1, 180),
+                )
+                for i in range(recipes)
+            ),
+            batch_size=batch_size,
+        )
+    recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+    Recipe.tags.through.objects.bulk_create(
+        (
+            Recipe.tags.through(recipe_id=recipe_id, tag_id=tag_id)
+            for recipe_id in recipe_ids
+            for tag_id in rng.sample(tag_ids, rng.randint(1, len(tag_ids)))
+        ),
+        batch_size=batch_size,
+    )
+    AmountIngredient.objects.bulk_create(
+        (
+            AmountIngredient(
+                recipe_id=recipe_id, ingredient_id=ingredient_id,
+                amount=rng.randint(1, 500),
+            )
+            for recipe_id in recipe_ids
+            for ingredient_id in rng.sample(
+                ingredient_ids, min(ingredients_per_recipe, ingredients)
+            )
+        ),
+        batch_size=batch_size,
+    )
+    Follow.objects.bulk_create(
+        (
+            Follow(user_id=user_id, author_id=author_id)
+            for user_id in user_ids
+            for author_id in rng.sample(
+                user_ids, min(follows_per_user + 1, len(user_ids))
+            )[:follows_per_user]
+            if author_id != user_id
+        ),
+        batch_size=batch_size,
+    )
+    for model, per_user in (
+        (Favorited, favorites_per_user), (Carts, carts_per_user)
+    ):
+        model.objects.bulk_create(
+            (
+                model(user_id=user_id, recipe_id=recipe_id)
+                for user_id in user_ids
+                for recipe_id in rng.sample(
+                    recipe_ids, min(per_user, len(recipe_ids))
+                )
+            ),
+            batch_size=batch_size,
+        )
+    ShoppingListLine.objects.bulk_create(
+        (
+            ShoppingListLine(
+                user_id=row['user'], ingredient_id=row['ingredient'],
+                total_amount=row['total_amount'],
+            )
+            for row in ShoppingListLine.objects.live_totals().iterator()
+        ),
+        batch_size=batch_size,
+    )
+    # bulk_create не отправляет сигналы, счётчики пересчитываются разом.
+    reconcile()
+    return user_ids, recipe_ids
@@ -0,0 +1,172 @@
+import asyncio
+import time
+from collections import Counter
+
+from rest_framework.authtoken.models import Token
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from ._benchmark import (free_port, gunicorn, seed, summarize,
+                         temporary_database)
+
+# Приложение и окружение gunicorn: один процесс в обоих профилях.
+PROFILES = {
+    'wsgi': ('foodgram_backend.wsgi', {
+        'GUNICORN_WORKER_CLASS': 'gthread',
+        'GUNICORN_WORKERS': '1',
+        'GUNICORN_THREADS': '8',
+    }),
+    'asgi': ('foodgram_backend.asgi', {
+        'GUNICORN_WORKER_CLASS': 'uvicorn.workers.UvicornWorker',
+        'GUNICORN_WORKERS': '1',
+        'ASYNC_VIEWS': 'True',
+    }),
+}
+SLOW_PATH = '/api/recipes/download_shopping_cart/'
+PROBE_PATH = '/api/tags/'
+
+
+async def slow_request(port, path, token, pieces, delay, read_size,
+                       start_after=0):
+    """Запрос медленного клиента.
+
+    Заголовки приходят частями с паузами, ответ читается небольшими
+    порциями. Возвращает код ответа и время в миллисекундах.
+    """
+    await asyncio.sleep(start_after)
+    started = time.perf_counter()
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        request = (
+            f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+            f'Authorization: Token {token}\r\nConnection: close\r\n\r\n'
+        ).encode()
+        step = -(-len(request) // pieces)
+        for start in range(0, len(request), step):
+            if start:
+                await asyncio.sleep(delay)
+            writer.write(request[start:start + step])
+            await writer.drain()
+        status = int((await reader.readline()).split()[1])
+        while await reader.read(read_size):
+            await asyncio.sleep(delay)
+    finally:
+        writer.close()
+    return status, (time.perf_counter() - started) * 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнить один процесс WSGI и ASGI под нагрузкой медленных '
+        'клиентов, скачивающих список покупок'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=500)
+        parser.add_argument(
+            '--pieces', type=int, default=4,
+            help='На сколько частей клиент делит заголовки запроса.',
+        )
+        parser.add_argument(
+            '--delay', type=float, default=0.25,
+            help='Пауза медленного клиента между частями, в секундах.',
+        )
+        parser.add_argument(
+            '--rate', type=float, default=50,
+            help=(
+                'Новых клиентов в секунду. Если начать всех разом, ядро '
+                'успеет принять запросы целиком ещё до того, как сервер '
+                'их прочтёт, и медленные клиенты ничего не заметят.'
+            ),
+        )
+        parser.add_argument('--read-size', type=int, default=512)
+        parser.add_argument('--timeout', type=float, default=300)
+        parser.add_argument(
+            '--profiles',
+            nargs='+',
+            choices=PROFILES,
+            default=list(PROFILES),
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Нужна база PostgreSQL')
+        with temporary_database():
+            user_ids, _ = seed(recipes=1000, users=options['clients'] // 10)
+            tokens = [
+                Token.objects.create(user_id=user_id).key
+                for user_id in user_ids
+            ]
+            connection.close()
+            for name in options['profiles']:
+                app, overrides = PROFILES[name]
+                port = free_port()
+                with gunicorn(app, port, overrides):
+                    result = asyncio.run(self.load(port, tokens, options))
+                self.report(name, result)
+
+    async def load(self, port, tokens, options):
+        arrival = options['clients'] / options['rate']
+        clients = [
+            asyncio.wait_for(
+                slow_request(
+                    port, SLOW_PATH, tokens[number % len(tokens)],
+                    options['pieces'], options['delay'],
+                    options['read_size'], number / options['rate'],
+                ),
+                number / options['rate'] + options['timeout'],
+            )
+            for number in range(options['clients'])
+        ]
+        started = time.perf_counter()
+        slow = asyncio.gather(*clients, return_exceptions=True)
+        probes = []
+        # Быстрый клиент рядом с медленными: сколько ждёт обычный запрос,
+        # пока приходят новые медленные клиенты.
+        while time.perf_counter() - started < arrival:
+            try:
+                status, elapsed = await asyncio.wait_for(
+                    slow_request(port, PROBE_PATH, tokens[0], 1, 0, 65536),
+                    options['timeout'],
+                )
+            except (OSError, asyncio.TimeoutError):
+                continue
+            if status == 200:
+                probes.append(elapsed)
+        timings, errors = [], Counter()
+        for result in await slow:
+            if isinstance(result, BaseException):
+                errors[type(result).__name__] += 1
+            elif result[0] != 200:
+                errors[result[0]] += 1
+            else:
+                timings.append(result[1])
+        return {
+            'total_s': time.perf_counter() - started,
+            'slow': timings,
+            'errors': errors,
+            'probes': probes,
+        }
+
+    def report(self, name, result):
+        if not result['slow']:
+            raise CommandError(
+                f"{name}: нет успешных ответов {dict(result['errors'])}"
+            )
+        slow = summarize(result['slow'])
+        line = (
+            f"{name:<5} {len(result['slow'])} клиентов за "
+            f"{result['total_s']:.1f} с, "
+            f"медленные p50 {slow['p50_ms']:.0f} ms p95 {slow['p95_ms']:.0f}"
+            ' ms'
+        )
+        if result['probes']:
+            probe = summarize(result['probes'])
+            line += (
+                f", быстрый запрос p50 {probe['p50_ms']:.0f} ms "
+                f"p95 {probe['p95_ms']:.0f} ms"
+            )
+        if result['errors']:
+            line += f", ошибки {dict(result['errors'])}"
+        self.stdout.write(line)
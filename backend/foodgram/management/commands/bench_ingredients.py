@@ -0,0 +1,51 @@
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+
+from foodgram.models import Ingredient
+from foodgram.search import ingredient_index
+
+from ._benchmark import api_client, format_stats, measure
+
+
+class Command(BaseCommand):
+    help = 'Сравнить автодополнение ингредиентов из индекса и из базы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=500)
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        if not names:
+            raise CommandError(
+                'Нет ингредиентов, сначала выполните load_data'
+            )
+        rng = random.Random(options['seed'])
+        prefixes = [
+            rng.choice(names)[:rng.randint(1, 3)]
+            for _ in range(options['repeat'])
+        ]
+        limit = options['limit']
+        client = api_client()
+
+        def database(prefix):
+            client.get('/api/ingredients/', {'name': prefix})
+
+        def autocomplete(prefix):
+            client.get(
+                '/api/ingredients/autocomplete/',
+                {'name': prefix, 'limit': limit},
+            )
+
+        def index(prefix):
+            ingredient_index.search(prefix, limit)
+
+        arguments = [(prefix,) for prefix in prefixes]
+        for name, func in (
+            ('GET /api/ingredients/?name=', database),
+            ('GET /api/ingredients/autocomplete/', autocomplete),
+            ('IngredientIndex.search', index),
+        ):
+            self.stdout.write(format_stats(name, measure(func, arguments)))
@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from api.pagination import KeysetPagination
+from foodgram.models import Recipe
+
+from ._benchmark import (NO_CACHE, api_client, format_stats, measure, seed,
+                         temporary_database)
+
+
+class Command(BaseCommand):
+    help = 'Сравнить постраничную и курсорную пагинацию ленты рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=20000)
+        parser.add_argument('--limit', type=int, default=10)
+        parser.add_argument('--page', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        limit, page = options['limit'], options['page']
+        if page * limit > options['recipes']:
+            raise CommandError('Страница за пределами набора рецептов')
+        # Анонимная лента кэшируется: без отключения кэша повторы
+        # измеряли бы чтение из кэша, а не запрос страницы.
+        with override_settings(CACHES=NO_CACHE), temporary_database():
+            seed(recipes=options['recipes'], users=50)
+            previous = Recipe.objects.order_by(
+                '-pub_date', '-id'
+            )[(page - 1) * limit - 1]
+            cursor = KeysetPagination.make_cursor(
+                [previous.pub_date.isoformat(), previous.pk]
+            )
+            client = api_client()
+            requests = {
+                'page=1': {'page': 1, 'limit': limit},
+                f'page={page}': {'page': page, 'limit': limit},
+                'cursor (1)': {'cursor': '', 'limit': limit},
+                f'cursor ({page})': {'cursor': cursor, 'limit': limit},
+            }
+            results = {}
+            for name, params in requests.items():
+                response = client.get('/api/recipes/', params)
+                results[name] = [
+                    recipe['id'] for recipe in response.json()['results']
+                ]
+                stats = measure(
+                    client.get,
+                    [('/api/recipes/', params)] * options['repeat'],
+                )
+                self.stdout.write(format_stats(name, stats))
+            if results[f'page={page}'] != results[f'cursor ({page})']:
+                raise CommandError('Режимы вернули разные страницы')
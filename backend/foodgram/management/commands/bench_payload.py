@@ -0,0 +1,66 @@
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.compression import ENCODINGS
+from api.renderers import FastJSONRenderer, orjson
+
+from ._benchmark import api_client, measure, seed, temporary_database
+
+LIST_FIELDS = (
+    'id,tags,author,is_favorited,is_in_shopping_cart,name,image,cooking_time'
+)
+VARIANTS = {
+    'полный': {},
+    'без text и ingredients': {'fields': LIST_FIELDS, 'expand': 'author,tags'},
+    'без text и ingredients, id': {'fields': LIST_FIELDS},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнить размер страницы ленты рецептов и время её рендеринга '
+        'в JSON с разными наборами полей, рендерерами и сжатием'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=200)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write('orjson не установлен, FastJSONRenderer = JSON')
+        repeat = options['repeat']
+        with temporary_database():
+            user_ids, _ = seed(recipes=options['recipes'])
+            token = Token.objects.create(user_id=user_ids[0]).key
+            client = api_client(HTTP_AUTHORIZATION=f'Token {token}')
+            for name, params in VARIANTS.items():
+                params = {'limit': options['limit'], **params}
+                response = client.get('/api/recipes/', params)
+                if response.status_code != 200:
+                    raise CommandError(f'Ответ {response.status_code}')
+                data, body = response.data, response.content
+                if JSONRenderer().render(data) != body:
+                    raise CommandError(f'{name}: рендереры разошлись')
+                self.stdout.write(
+                    f'{name}: страница {len(body)} Б, запрос p50 '
+                    f"{self.time(client.get, ('/api/recipes/', params)):.2f}"
+                    ' ms'
+                )
+                for renderer in (JSONRenderer(), FastJSONRenderer()):
+                    self.stdout.write(
+                        f'  {type(renderer).__name__:<24} '
+                        f'{self.time(renderer.render, (data,), repeat):.3f} ms'
+                    )
+                for encoding, (compress, _) in ENCODINGS.items():
+                    self.stdout.write(
+                        f'  {encoding:<24} {self.time(compress, (body,)):.3f}'
+                        f' ms, {len(compress(body))} Б'
+                    )
+
+    @staticmethod
+    def time(func, args, repeat=50):
+        return measure(func, [args] * repeat)['p50_ms']
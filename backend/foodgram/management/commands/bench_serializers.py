@@ -0,0 +1,111 @@
+from contextlib import contextmanager
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import BooleanField, Count, Exists, OuterRef, Value
+
+from api.serializers import (FastRepresentationMixin, IngredientSerializer,
+                             RecipeReadSerializer, SubscribeListSerializer,
+                             TagSerializer, UserSerializer)
+from api.views import RecipeViewSet, UserViewSet
+from foodgram.models import Ingredient, Recipe, Tag
+from users.models import Follow, User
+
+from ._benchmark import format_stats, measure, seed, temporary_database
+
+
+@contextmanager
+def reference_serialization():
+    """Сериализаторы на время блока работают как обычные ModelSerializer."""
+    FastRepresentationMixin.fast_representation = False
+    try:
+        yield
+    finally:
+        FastRepresentationMixin.fast_representation = True
+
+
+def orphan_recipe(pk):
+    """Рецепт без автора, как после удаления аккаунта (SET_NULL)."""
+    Recipe.objects.filter(pk=pk).update(author=None)
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверить быстрый путь сериализации со стандартным побайтно '
+        'и сравнить их время'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=30)
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            user_ids, recipe_ids = seed(recipes=options['recipes'])
+            orphan_recipe(recipe_ids[0])
+            user = User.objects.get(pk=user_ids[0])
+            for name, serializer_class, objects, context in self.cases(user):
+                self.compare(
+                    name, serializer_class, objects, context,
+                    options['repeat'],
+                )
+
+    def cases(self, user):
+        """Данные в том виде, в каком их готовят представления."""
+        factory = APIRequestFactory()
+        for action, request_user in (('list', None), ('retrieve', user)):
+            request = Request(factory.get('/api/recipes/'))
+            if request_user is not None:
+                request.user = request_user
+            view = RecipeViewSet(
+                request=request, action=action, format_kwarg=None,
+                kwargs={},
+            )
+            yield (
+                f'рецепты, {action}', RecipeReadSerializer,
+                list(view.get_queryset()),
+                view.get_serializer_context(),
+            )
+        request = Request(factory.get('/api/users/'))
+        request.user = user
+        context = {'request': request}
+        users = User.objects.annotate(is_subscribed=Exists(
+            Follow.objects.filter(user=user, author=OuterRef('pk'))
+        )).order_by('id')
+        yield 'пользователи', UserSerializer, list(users), context
+        authors = list(
+            User.objects.filter(following__user=user)
+            .annotate(recipe_count=Count('recipes'),
+                      is_subscribed=Value(True, BooleanField()))
+            .order_by('username', 'id')
+        )
+        UserViewSet.attach_recipes(authors, 3)
+        yield 'подписки', SubscribeListSerializer, authors, context
+        yield 'теги', TagSerializer, list(Tag.objects.all()), context
+        yield (
+            'ингредиенты', IngredientSerializer,
+            list(Ingredient.objects.all()), context,
+        )
+
+    def compare(self, name, serializer_class, objects, context, repeat):
+        def serialize():
+            return serializer_class(
+                objects, many=True, context=context
+            ).data
+
+        renderer = JSONRenderer()
+        with reference_serialization():
+            expected = renderer.render(serialize())
+            reference = measure(serialize, [()] * repeat)
+        if renderer.render(serialize()) != expected:
+            raise CommandError(f'{name}: быстрый путь разошёлся с обычным')
+        fast = measure(serialize, [()] * repeat)
+        label = f'{name} ({len(objects)})'
+        self.stdout.write(format_stats(f'{label}, обычный', reference))
+        self.stdout.write(format_stats(f'{label}, быстрый', fast))
+        self.stdout.write(
+            f"  ускорение x{reference['p50_ms'] / fast['p50_ms']:.1f}"
+        )
@@ -0,0 +1,101 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from rest_framework.authtoken.models import Token
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from ._benchmark import (free_port, gunicorn, http_get, seed, summarize,
+                         temporary_database)
+
+# Окружение gunicorn для каждого профиля поверх общего.
+PROFILES = {
+    'baseline': {
+        'GUNICORN_WORKER_CLASS': 'sync',
+        'GUNICORN_WORKERS': '1',
+        'GUNICORN_PRELOAD': 'False',
+        'DB_CONN_MAX_AGE': '0',
+        'DB_CONN_HEALTH_CHECKS': 'False',
+    },
+    'persistent': {},
+    'pool': {'DB_POOL_MAX_SIZE': '16'},
+}
+PATH = '/api/recipes/?limit=6'
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнить запросы в секунду к ленте рецептов под gunicorn '
+        'с разными профилями сервера и соединений с базой'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--duration', type=float, default=10)
+        parser.add_argument(
+            '--profiles',
+            nargs='+',
+            choices=PROFILES,
+            default=list(PROFILES),
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Нужна база PostgreSQL')
+        with temporary_database():
+            user_ids, _ = seed(recipes=options['recipes'], users=50)
+            token = Token.objects.create(user_id=user_ids[0]).key
+            connection.close()
+            results = {}
+            for name in options['profiles']:
+                port = free_port()
+                with gunicorn('foodgram_backend.wsgi', port, PROFILES[name]):
+                    stats = self.load(port, token, options)
+                results[name] = stats
+                self.stdout.write(
+                    f"{name:<12} {stats['rps']:>8.1f} rps  "
+                    f"p50 {stats['p50_ms']:>8.2f} ms  "
+                    f"p95 {stats['p95_ms']:>8.2f} ms  "
+                    f"ошибок {stats['errors']}"
+                )
+        base = results.get('baseline')
+        if base and base['rps']:
+            for name, stats in results.items():
+                if name != 'baseline':
+                    self.stdout.write(
+                        f"{name}: x{stats['rps'] / base['rps']:.2f} "
+                        'к baseline'
+                    )
+
+    def load(self, port, token, options):
+        timings, errors = [], []
+        lock = threading.Lock()
+        deadline = time.monotonic() + options['duration']
+
+        def worker():
+            while time.monotonic() < deadline:
+                start = time.perf_counter()
+                try:
+                    status = http_get(port, PATH, token)
+                except OSError:
+                    status = None
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    if status == 200:
+                        timings.append(elapsed)
+                    else:
+                        errors.append(status)
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            for _ in range(options['concurrency']):
+                pool.submit(worker)
+        if not timings:
+            raise CommandError(f'Нет успешных ответов: {errors[:5]}')
+        stats = summarize(timings)
+        stats['rps'] = round(len(timings) / (time.monotonic() - started), 1)
+        stats['errors'] = len(errors)
+        return stats
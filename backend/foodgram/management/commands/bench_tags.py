@@ -0,0 +1,70 @@
+from functools import reduce
+from operator import or_
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.test import override_settings
+
+from foodgram.models import Recipe, Tag
+
+from ._benchmark import (NO_CACHE, api_client, format_stats, measure, seed,
+                         temporary_database)
+
+
+class Command(BaseCommand):
+    help = 'Сравнить фильтр по тегам через JOIN с DISTINCT и через Exists'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=100000)
+        parser.add_argument('--tags', type=int, default=8)
+        parser.add_argument('--limit', type=int, default=6)
+        parser.add_argument('--repeat', type=int, default=30)
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        # Кэш ленты скрыл бы стоимость самого запроса.
+        with override_settings(CACHES=NO_CACHE), temporary_database():
+            seed(
+                recipes=options['recipes'], tags=options['tags'],
+                ingredients_per_recipe=2, favorites_per_user=0,
+                carts_per_user=0,
+            )
+            slugs = list(Tag.objects.values_list('slug', flat=True))
+            ordered = Recipe.objects.order_by('-pub_date', '-id')
+
+            def join_distinct():
+                # Так фильтровал ModelMultipleChoiceFilter по tags__slug.
+                queryset = ordered.filter(
+                    reduce(or_, (Q(tags__slug=slug) for slug in slugs))
+                ).distinct()
+                return queryset.count(), list(
+                    queryset.values_list('id', flat=True)[:limit]
+                )
+
+            client = api_client()
+            params = {'tags': slugs, 'limit': limit}
+
+            def endpoint():
+                response = client.get('/api/recipes/', params)
+                return response.json()
+
+            def exists():
+                response = endpoint()
+                return response['count'], [
+                    recipe['id'] for recipe in response['results']
+                ]
+
+            old, new = join_distinct(), exists()
+            if old != new:
+                raise CommandError(
+                    f'Фильтры вернули разное: {old[0]} и {new[0]} рецептов'
+                )
+            self.stdout.write(
+                f'Тегов в фильтре: {len(slugs)}, рецептов найдено {new[0]}'
+            )
+            for name, func in (
+                ('JOIN + DISTINCT (count и страница)', join_distinct),
+                ('GET /api/recipes/?tags=... (Exists)', endpoint),
+            ):
+                stats = measure(func, [()] * options['repeat'])
+                self.stdout.write(format_stats(name, stats))
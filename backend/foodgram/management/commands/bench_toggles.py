@@ -0,0 +1,102 @@
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from rest_framework.authtoken.models import Token
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from foodgram.counters import stale_recipes
+
+from ._benchmark import api_client, seed, summarize, temporary_database
+
+KINDS = ('favorite', 'shopping_cart')
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверить добавление в избранное и корзину под конкуренцией: '
+        'параллельные запросы из пула потоков'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=16)
+        parser.add_argument('--rounds', type=int, default=20)
+        parser.add_argument('--recipes', type=int, default=100)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Нужна база PostgreSQL')
+        workers = options['workers']
+        with temporary_database():
+            user_ids, recipe_ids = seed(
+                users=workers, recipes=options['recipes'],
+                ingredients_per_recipe=2, follows_per_user=0,
+                favorites_per_user=0, carts_per_user=0,
+            )
+            tokens = [
+                Token.objects.create(user_id=user_id).key
+                for user_id in user_ids
+            ]
+            self.timings = []
+            self.lock = threading.Lock()
+            with ThreadPoolExecutor(workers) as pool:
+                self.pool = pool
+                for number in range(options['rounds']):
+                    kind = KINDS[number % len(KINDS)]
+                    recipe_id = recipe_ids[number % len(recipe_ids)]
+                    self.check_round(kind, recipe_id, tokens)
+            stale = stale_recipes().count()
+            if stale:
+                raise CommandError(f'Счётчики расходятся у {stale} рецептов')
+        stats = summarize(self.timings)
+        self.stdout.write(
+            f"Запросов {stats['runs']}, p50 {stats['p50_ms']:.3f} ms, "
+            f"p95 {stats['p95_ms']:.3f} ms, p99 {stats['p99_ms']:.3f} ms"
+        )
+        self.stdout.write(self.style.SUCCESS('Гонок не обнаружено'))
+
+    def check_round(self, kind, recipe_id, tokens):
+        """Гонки одного пользователя и разных пользователей за рецепт.
+
+        Сначала один пользователь жмёт кнопку из всех потоков сразу:
+        ровно один запрос должен пройти. Затем все пользователи
+        одновременно добавляют и удаляют один и тот же рецепт.
+        """
+        url = f'/api/recipes/{recipe_id}/{kind}/'
+        same_user = [tokens[0]] * len(tokens)
+        for method, expected in (('post', 201), ('delete', 204)):
+            codes = self.fire(method, url, same_user)
+            wanted = Counter({expected: 1, 400: len(tokens) - 1})
+            if codes != wanted:
+                raise CommandError(
+                    f'{method.upper()} {url}: ответы {dict(codes)}, '
+                    f'ожидались {dict(wanted)}'
+                )
+        for method, expected in (('post', 201), ('delete', 204)):
+            codes = self.fire(method, url, tokens)
+            if codes != Counter({expected: len(tokens)}):
+                raise CommandError(
+                    f'{method.upper()} {url} от разных пользователей: '
+                    f'ответы {dict(codes)}'
+                )
+
+    def fire(self, method, url, tokens):
+        barrier = threading.Barrier(len(tokens))
+
+        def request(token):
+            client = api_client(HTTP_AUTHORIZATION=f'Token {token}')
+            try:
+                barrier.wait()
+                start = time.perf_counter()
+                response = getattr(client, method)(url)
+                elapsed = (time.perf_counter() - start) * 1000
+            finally:
+                connections.close_all()
+            with self.lock:
+                self.timings.append(elapsed)
+            return response.status_code
+
+        return Counter(self.pool.map(request, tokens))
@@ -0,0 +1,271 @@
+import json
+import platform
+import random
+import subprocess
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from rest_framework.authtoken.models import Token
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+
+from api.authentication import token_cache
+from foodgram.models import Ingredient, Recipe, Tag
+
+from ._benchmark import NO_CACHE, api_client, profile, seed, temporary_database
+
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=='
+)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ('git', 'rev-parse', '--short', 'HEAD'),
+            cwd=settings.BASE_DIR, capture_output=True, check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Замерить задержку, пропускную способность и число запросов '
+        'ключевых эндпоинтов на синтетических данных'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--ingredients', type=int, default=2000)
+        parser.add_argument('--ingredients-per-recipe', type=int, default=8)
+        parser.add_argument('--follows', type=int, default=10)
+        parser.add_argument('--favorites', type=int, default=20)
+        parser.add_argument('--carts', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--no-cache',
+            action='store_true',
+            help='Замерять без кэша ответов.',
+        )
+        parser.add_argument(
+            '--output',
+            type=Path,
+            help='Куда записать отчёт в JSON.',
+        )
+        parser.add_argument(
+            '--compare',
+            type=Path,
+            help='Отчёт прошлого запуска для сравнения p50.',
+        )
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            if not options['compare'].is_file():
+                raise CommandError(f"Файл {options['compare']} не найден")
+            baseline = json.loads(options['compare'].read_text())
+        scale = {
+            'users': options['users'],
+            'recipes': options['recipes'],
+            'ingredients': options['ingredients'],
+            'ingredients_per_recipe': options['ingredients_per_recipe'],
+            'follows_per_user': options['follows'],
+            'favorites_per_user': options['favorites'],
+            'carts_per_user': options['carts'],
+        }
+        # Число запросов и так попадает в отчёт.
+        overrides = {'RECIPE_IMAGE_WORKERS': 0, 'METRICS_QUERY_THRESHOLD': 0}
+        if options['no_cache']:
+            overrides['CACHES'] = NO_CACHE
+        with tempfile.TemporaryDirectory() as media, override_settings(
+            MEDIA_ROOT=media, **overrides
+        ), temporary_database():
+            user_ids, recipe_ids = seed(
+                users=scale['users'],
+                recipes=scale['recipes'],
+                ingredients=scale['ingredients'],
+                ingredients_per_recipe=scale['ingredients_per_recipe'],
+                follows_per_user=scale['follows_per_user'],
+                favorites_per_user=scale['favorites_per_user'],
+                carts_per_user=scale['carts_per_user'],
+                random_seed=options['seed'],
+            )
+            results = self.run_cases(user_ids, recipe_ids, options)
+        report = {
+            'revision': git_revision(),
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'cache': not options['no_cache'],
+            'repeat': options['repeat'],
+            'scale': scale,
+            'endpoints': results,
+            'token_cache_saved_queries': (
+                results['recipes-list (token cache cold)']['queries_min']
+                - results['recipes-list']['queries_min']
+            ),
+        }
+        self.stdout.write(
+            'Кэш токенов экономит запросов на каждый запрос: '
+            f"{report['token_cache_saved_queries']}"
+        )
+        if options['output']:
+            options['output'].write_text(
+                json.dumps(report, ensure_ascii=False, indent=2)
+            )
+        if baseline is not None:
+            self.compare(report, baseline)
+
+    def run_cases(self, user_ids, recipe_ids, options):
+        rng = random.Random(options['seed'])
+        repeat = options['repeat']
+        user_id = user_ids[0]
+        token = Token.objects.create(user_id=user_id)
+        anonymous = api_client()
+        client = api_client(HTTP_AUTHORIZATION=f'Token {token.key}')
+        tag = Tag.objects.first()
+        ingredient_ids = list(Ingredient.objects.values_list('id', flat=True))
+        names = list(Ingredient.objects.values_list('name', flat=True))
+
+        def get(client, path, params=None):
+            response = client.get(path, params)
+            if response.streaming:
+                # Потоковый ответ формируется только при чтении.
+                b''.join(response.streaming_content)
+            return response
+
+        def get_cold_token(client, path, params=None):
+            # Каждый запрос аутентифицируется через базу.
+            token_cache.invalidate([token.key])
+            return get(client, path, params)
+
+        def recipe_payload(name):
+            return {
+                'name': name,
+                'text': 'Описание',
+                'cooking_time': rng.randint(1, 120),
+                'image': IMAGE,
+                'tags': [tag.id],
+                'ingredients': [
+                    {'id': pk, 'amount': rng.randint(1, 500)}
+                    for pk in rng.sample(
+                        ingredient_ids, options['ingredients_per_recipe']
+                    )
+                ],
+            }
+
+        def create(payload):
+            return client.post(
+                '/api/recipes/', payload, content_type='application/json'
+            )
+
+        created = []
+
+        def create_recipe(payload):
+            response = create(payload)
+            created.append(response.json()['id'])
+            return response
+
+        def update_recipe(index, payload):
+            return client.patch(
+                f'/api/recipes/{created[index % len(created)]}/',
+                payload, content_type='application/json',
+            )
+
+        lists = {
+            'recipes-list': {},
+            'recipes-list tags': {'tags': tag.slug},
+            'recipes-list author': {'author': user_ids[1]},
+            'recipes-list is_favorited': {'is_favorited': 1},
+            'recipes-list is_in_shopping_cart': {'is_in_shopping_cart': 1},
+            'recipes-list search': {'search': 'Рецепт 1'},
+            'recipes-list last page': {
+                'page': max(len(recipe_ids) // 6, 1),
+            },
+            'recipes-list cursor': {'cursor': ''},
+        }
+        cases = {}
+        for name, params in lists.items():
+            cases[f'{name} (anonymous)'] = (get, [
+                (anonymous, '/api/recipes/', {'limit': 6, **params})
+            ] * repeat)
+            cases[name] = (get, [
+                (client, '/api/recipes/', {'limit': 6, **params})
+            ] * repeat)
+        cases['recipes-list (token cache cold)'] = (get_cold_token, [
+            (client, '/api/recipes/', {'limit': 6})
+        ] * repeat)
+        cases['recipes-detail'] = (get, [
+            (client, f'/api/recipes/{rng.choice(recipe_ids)}/')
+            for _ in range(repeat)
+        ])
+        cases['recipes-create'] = (create_recipe, [
+            (recipe_payload(f'Бенчмарк {index}'),) for index in range(repeat)
+        ])
+        cases['recipes-update'] = (update_recipe, [
+            (index, recipe_payload(f'Бенчмарк {index}'))
+            for index in range(repeat)
+        ])
+        cases['users-subscriptions'] = (get, [
+            (
+                client, '/api/users/subscriptions/',
+                {'limit': 6, 'recipes_limit': 3},
+            )
+        ] * repeat)
+        cases['recipes-download-shopping-cart'] = (get, [
+            (client, '/api/recipes/download_shopping_cart/')
+        ] * repeat)
+        prefixes = [
+            rng.choice(names)[:rng.randint(1, 3)] for _ in range(repeat)
+        ]
+        cases['ingredients-list'] = (get, [
+            (client, '/api/ingredients/', {'name': prefix})
+            for prefix in prefixes
+        ])
+        cases['ingredients-autocomplete'] = (get, [
+            (client, '/api/ingredients/autocomplete/', {'name': prefix})
+            for prefix in prefixes
+        ])
+        results = {}
+        for name, (func, args_list) in cases.items():
+            # Создание и правка не прогреваются: каждый вызов меняет базу.
+            warmup = 0 if func in (create_recipe, update_recipe) else 3
+            results[name] = stats = profile(func, args_list, warmup)
+            self.stdout.write(
+                f"{name:<45} p50 {stats['p50_ms']:>8.2f} ms  "
+                f"p95 {stats['p95_ms']:>8.2f} ms  "
+                f"p99 {stats['p99_ms']:>8.2f} ms  "
+                f"{stats['rps']:>8.1f} rps  "
+                f"SQL {stats['queries_min']}-{stats['queries_max']}"
+            )
+        if Recipe.objects.filter(pk__in=created).count() != len(created):
+            raise CommandError('Не все созданные рецепты сохранились')
+        return results
+
+    def compare(self, report, baseline):
+        self.stdout.write(
+            f"Сравнение с {baseline.get('revision')} "
+            f"({baseline.get('created')}), p50:"
+        )
+        for name, stats in report['endpoints'].items():
+            old = baseline['endpoints'].get(name)
+            if old is None:
+                continue
+            ratio = stats['p50_ms'] / old['p50_ms'] if old['p50_ms'] else 0
+            line = (
+                f"{name:<45} {old['p50_ms']:>8.2f} -> "
+                f"{stats['p50_ms']:>8.2f} ms  x{ratio:.2f}"
+            )
+            style = self.style.ERROR if ratio > 1.2 else self.style.SUCCESS
+            self.stdout.write(style(line))
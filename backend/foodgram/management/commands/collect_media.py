@@ -0,0 +1,59 @@
+import posixpath
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from foodgram.models import Recipe
+from foodgram.storage import MIN_ORPHAN_AGE, is_recent
+
+
+def walk(storage, path):
+    directories, files = storage.listdir(path)
+    for name in files:
+        yield posixpath.join(path, name)
+    for directory in directories:
+        yield from walk(storage, posixpath.join(path, directory))
+
+
+class Command(BaseCommand):
+    help = 'Удалить изображения, на которые не ссылается ни один рецепт'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено.',
+        )
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=MIN_ORPHAN_AGE,
+            help='Не трогать файлы моложе стольких секунд.',
+        )
+
+    def handle(self, *args, **options):
+        referenced = set()
+        for image, variants in Recipe.objects.values_list(
+            'image', 'image_variants'
+        ).iterator():
+            referenced.add(image)
+            referenced.update(variants.values())
+        storage = default_storage
+        if not storage.exists('foodgram'):
+            return
+        removed = freed = 0
+        for name in walk(storage, 'foodgram'):
+            if name in referenced or is_recent(
+                storage, name, options['min_age']
+            ):
+                continue
+            freed += storage.size(name)
+            removed += 1
+            if options['dry_run']:
+                self.stdout.write(name)
+            else:
+                storage.delete(name)
+        self.stdout.write(self.style.SUCCESS(
+            f'Файлов без ссылок: {removed}, '
+            f'{freed / 1024 ** 2:.1f} МБ'
+        ))
@@ -0,0 +1,129 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from foodgram.models import (AmountIngredient, Carts, Favorited, Ingredient,
+                             Recipe, ShoppingListLine)
+from users.models import Follow
+
+from ._benchmark import seed, temporary_database
+
+
+class Command(BaseCommand):
+    help = (
+        'Показать планы основных запросов API и проверить, '
+        'что они идут по ожидаемым индексам'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=20000)
+        parser.add_argument('--users', type=int, default=500)
+        parser.add_argument(
+            '--verbose-plans',
+            action='store_true',
+            help='Печатать планы целиком.',
+        )
+
+    def get_cases(self, user_id, recipe_id, recipe_ids):
+        """Запросы из api/ и индекс, который должен их обслуживать.
+
+        Имя индекса — регулярное выражение по плану PostgreSQL, None
+        значит, что достаточно отсутствия полного просмотра таблицы.
+        """
+        tag_slug = Recipe.objects.get(pk=recipe_id).tags.first().slug
+        return (
+            (
+                'лента рецептов',
+                Recipe.objects.order_by('-pub_date', '-id')[:6],
+                'recipe_pub_date_id_idx',
+            ),
+            (
+                'рецепты автора',
+                Recipe.objects.filter(author=user_id).order_by(
+                    '-pub_date', '-id'
+                )[:6],
+                'recipe_author_pub_date_idx',
+            ),
+            (
+                'фильтр по тегу',
+                Recipe.tags.through.objects.filter(tag__slug=tag_slug),
+                'foodgram_recipe_tags_tag_id',
+            ),
+            (
+                'ингредиенты рецептов страницы',
+                AmountIngredient.objects.filter(recipe__in=recipe_ids),
+                'unique_recipe_ingredient',
+            ),
+            (
+                'флаг is_favorited',
+                Favorited.objects.filter(user=user_id, recipe=recipe_id),
+                'foodgram_favorited_(unique|recipe_user)',
+            ),
+            (
+                'флаг is_in_shopping_cart',
+                Carts.objects.filter(user=user_id, recipe=recipe_id),
+                'foodgram_carts_(unique|recipe_user)',
+            ),
+            (
+                'корзины рецепта',
+                Carts.objects.filter(recipe=recipe_id).values('user'),
+                'foodgram_carts_recipe_user',
+            ),
+            (
+                'подписки пользователя',
+                Follow.objects.filter(user=user_id).values('author'),
+                'unique_follow|users_follow_user_id',
+            ),
+            (
+                'список покупок',
+                ShoppingListLine.objects.filter(user=user_id),
+                'unique_shopping_list_line|shoppinglistline_user_id',
+            ),
+            (
+                'поиск ингредиента по началу',
+                Ingredient.objects.filter(name__startswith='ингредиент 199'),
+                'foodgram_ingredient_name',
+            ),
+        )
+
+    @staticmethod
+    def check_plan(queryset, plan, expected):
+        table = re.escape(queryset.model._meta.db_table)
+        if connection.vendor == 'sqlite':
+            # LIKE в SQLite регистронезависим и индексом не пользуется.
+            if queryset.model is Ingredient:
+                return True
+            return not re.search(
+                rf'\bSCAN {table}(?! USING)', plan
+            )
+        if re.search(rf'Seq Scan on "?{table}"?\b', plan):
+            return False
+        return expected is None or bool(re.search(expected, plan))
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            user_ids, recipe_ids = seed(
+                recipes=options['recipes'], users=options['users']
+            )
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            cases = self.get_cases(user_ids[0], recipe_ids[0], recipe_ids[:6])
+            failures = []
+            for name, queryset, expected in cases:
+                plan = queryset.explain()
+                used = self.check_plan(queryset, plan, expected)
+                if not used:
+                    failures.append(name)
+                status = (
+                    self.style.SUCCESS('OK') if used else self.style.ERROR(
+                        'НЕТ ИНДЕКСА'
+                    )
+                )
+                self.stdout.write(f'{status} {name} ({expected or "-"})')
+                if options['verbose_plans'] or not used:
+                    self.stdout.write(plan)
+        if failures:
+            raise CommandError(
+                'Запросы без ожидаемого индекса: ' + ', '.join(failures)
+            )
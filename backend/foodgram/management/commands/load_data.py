@@ -1,25 +1,139 @@
+import csv
+import hashlib
 import json
+import time
+from itertools import islice
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
 
-from foodgram.models import Ingredient, Tag
+from api.cache import bump_version
+from foodgram.models import DataImport, Ingredient, Tag
+
+CHUNK_SIZE = 64 * 1024
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def iter_json(file):
+    """Читает массив объектов JSON по одному, не загружая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = file.read(CHUNK_SIZE).lstrip()
+    if not buffer.startswith('['):
+        raise CommandError('Ожидается массив JSON')
+    buffer = buffer[1:]
+    while True:
+        buffer = buffer.lstrip()
+        if buffer.startswith(','):
+            buffer = buffer[1:].lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Файл JSON оборван')
+            buffer += chunk
+            continue
+        yield item
+        buffer = buffer[end:]
+
+
+def iter_csv(file, fields):
+    for row in csv.reader(file):
+        if row:
+            yield dict(zip(fields, row))
+
+
+def batches(items, size):
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
 
 
 class Command(BaseCommand):
     help = 'Загрузить данные в модель ингредиетов'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ingredients',
+            default=settings.BASE_DIR / 'data' / 'ingredients.json',
+            type=Path,
+            help='Файл ингредиентов, .json или .csv.',
+        )
+        parser.add_argument(
+            '--tags',
+            default=settings.BASE_DIR / 'data' / 'tags.json',
+            type=Path,
+            help='Файл тэгов, .json или .csv.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            default=1000,
+            type=int,
+            help='Количество строк в одном INSERT.',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Загрузить файлы, даже если они не менялись.',
+        )
+
     def handle(self, *args, **options):
         self.stdout.write(self.style.WARNING('Старт команды'))
-        with open('data/ingredients.json', encoding='utf-8',
-                  ) as data_file_ingredients:
-            ingredient_data = json.loads(data_file_ingredients.read())
-            for ingredients in ingredient_data:
-                Ingredient.objects.get_or_create(**ingredients)
-
-        with open('data/tags.json', encoding='utf-8',
-                  ) as data_file_tags:
-            tags_data = json.loads(data_file_tags.read())
-            for tags in tags_data:
-                Tag.objects.get_or_create(**tags)
-
+        for model, path, fields, namespace in (
+            (
+                Ingredient, options['ingredients'],
+                ('name', 'measurement_unit'), 'ingredients',
+            ),
+            (Tag, options['tags'], ('name', 'color', 'slug'), 'tags'),
+        ):
+            if self.load(model, path, fields, options):
+                # bulk_create не отправляет post_save.
+                bump_version(namespace)
         self.stdout.write(self.style.SUCCESS('Данные загружены'))
+
+    @transaction.atomic
+    def load(self, model, path, fields, options):
+        if not path.is_file():
+            raise CommandError(f'Файл {path} не найден')
+        checksum = file_checksum(path)
+        source = f'{model._meta.label}:{path.name}'
+        if not options['force'] and DataImport.objects.filter(
+            source=source, checksum=checksum
+        ).exists():
+            self.stdout.write(f'{path.name}: без изменений, пропущен')
+            return False
+        started = time.perf_counter()
+        before = model.objects.count()
+        rows = 0
+        with open(path, encoding='utf-8', newline='') as file:
+            if path.suffix == '.csv':
+                items = iter_csv(file, fields)
+            else:
+                items = iter_json(file)
+            for batch in batches(items, options['batch_size']):
+                model.objects.bulk_create(
+                    (model(**item) for item in batch),
+                    ignore_conflicts=True,
+                )
+                rows += len(batch)
+        elapsed = time.perf_counter() - started
+        DataImport.objects.update_or_create(
+            source=source, defaults={'checksum': checksum, 'rows': rows}
+        )
+        self.stdout.write(
+            f'{path.name}: {rows} строк, добавлено '
+            f'{model.objects.count() - before}, {elapsed:.3f} с, '
+            f'{rows / elapsed if elapsed else rows:.0f} строк/с'
+        )
+        return True
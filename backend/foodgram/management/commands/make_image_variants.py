@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from foodgram.images import make_variants
+from foodgram.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Подготовить уменьшенные копии изображений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать копии, даже если они уже есть.',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image='').only(
+            'pk', 'image', 'image_variants'
+        )
+        done = 0
+        for recipe in recipes.iterator():
+            if not options['force'] and (
+                recipe.image_variants.get('source') == recipe.image.name
+            ):
+                continue
+            try:
+                make_variants(recipe.pk, recipe.image.name)
+            except OSError as error:
+                self.stderr.write(f'{recipe.image.name}: {error}')
+                continue
+            done += 1
+        self.stdout.write(self.style.SUCCESS(f'Обработано рецептов: {done}'))
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from foodgram.models import ShoppingListLine
+
+
+class Command(BaseCommand):
+    help = 'Пересобрать сводные списки покупок и сверить их с корзинами'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify-only',
+            action='store_true',
+            help='Только сверить таблицу с корзинами, ничего не меняя.',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Размер пачки при вставке строк.',
+        )
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            self.rebuild(options['batch_size'])
+        mismatches = self.verify()
+        if mismatches:
+            raise CommandError(
+                f'Расхождений со списками покупок: {mismatches}'
+            )
+        self.stdout.write(self.style.SUCCESS('Списки покупок совпадают'))
+
+    @transaction.atomic
+    def rebuild(self, batch_size):
+        self.stdout.write(self.style.WARNING('Пересборка списков покупок'))
+        ShoppingListLine.objects.all().delete()
+        lines = (
+            ShoppingListLine(
+                user_id=row['user'],
+                ingredient_id=row['ingredient'],
+                total_amount=row['total_amount'],
+            )
+            for row in ShoppingListLine.objects.live_totals().iterator()
+        )
+        created = ShoppingListLine.objects.bulk_create(
+            lines, batch_size=batch_size
+        )
+        self.stdout.write(f'Создано строк: {len(created)}')
+
+    def verify(self):
+        stored = {
+            (line['user'], line['ingredient']): line['total_amount']
+            for line in ShoppingListLine.objects.values(
+                'user', 'ingredient', 'total_amount'
+            ).iterator()
+        }
+        mismatches = 0
+        for row in ShoppingListLine.objects.live_totals().iterator():
+            key = (row['user'], row['ingredient'])
+            if stored.pop(key, None) != row['total_amount']:
+                mismatches += 1
+                self.stdout.write(self.style.ERROR(
+                    f'Пользователь {key[0]}, ингредиент {key[1]}: '
+                    f'ожидалось {row["total_amount"]}'
+                ))
+        for user, ingredient in stored:
+            mismatches += 1
+            self.stdout.write(self.style.ERROR(
+                f'Пользователь {user}, ингредиент {ingredient}: '
+                'лишняя строка'
+            ))
+        return mismatches
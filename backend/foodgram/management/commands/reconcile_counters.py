@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from foodgram.counters import reconcile, stale_recipes
+
+
+class Command(BaseCommand):
+    help = 'Сверить счётчики избранного и корзин рецептов с таблицами'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify-only',
+            action='store_true',
+            help='Только найти расхождения, ничего не меняя.',
+        )
+
+    def handle(self, *args, **options):
+        if options['verify_only']:
+            stale = stale_recipes().count()
+            if stale:
+                raise CommandError(f'Счётчики расходятся у {stale} рецептов')
+            self.stdout.write(self.style.SUCCESS('Счётчики совпадают'))
+            return
+        fixed = reconcile()
+        self.stdout.write(
+            self.style.SUCCESS(f'Исправлены счётчики у {fixed} рецептов')
+        )
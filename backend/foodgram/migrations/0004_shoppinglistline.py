@@ -0,0 +1,52 @@
+# Generated by Django 3.2.25 on 2026-10-17 03:56
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shopping_list(apps, schema_editor):
+    AmountIngredient = apps.get_model('foodgram', 'AmountIngredient')
+    ShoppingListLine = apps.get_model('foodgram', 'ShoppingListLine')
+    totals = AmountIngredient.objects.filter(
+        recipe__shopping_cart__isnull=False
+    ).order_by().values(
+        'ingredient', user=models.F('recipe__shopping_cart__user')
+    ).annotate(total_amount=models.Sum('amount'))
+    ShoppingListLine.objects.bulk_create(
+        ShoppingListLine(
+            user_id=row['user'],
+            ingredient_id=row['ingredient'],
+            total_amount=row['total_amount'],
+        )
+        for row in totals
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('foodgram', '0003_auto_20230815_0013'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingListLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_amount', models.PositiveIntegerField(verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list_lines', to='foodgram.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_list', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Строка списка покупок',
+                'verbose_name_plural': 'Список покупок',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='shoppinglistline',
+            constraint=models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_shopping_list_line'),
+        ),
+        migrations.RunPython(fill_shopping_list, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,46 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import TrigramExtension
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+# Выражение должно совпадать с foodgram.search.recipe_search_vector.
+SEARCH_INDEXES = (
+    GinIndex(
+        SearchVector('name', weight='A', config='russian')
+        + SearchVector('text', weight='B', config='russian'),
+        name='recipe_search_vector_idx',
+    ),
+    GinIndex(
+        fields=['name'],
+        name='recipe_name_trgm_idx',
+        opclasses=['gin_trgm_ops'],
+    ),
+)
+
+
+def add_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Recipe = apps.get_model('foodgram', 'Recipe')
+    for index in SEARCH_INDEXES:
+        schema_editor.add_index(Recipe, index)
+
+
+def remove_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    Recipe = apps.get_model('foodgram', 'Recipe')
+    for index in SEARCH_INDEXES:
+        schema_editor.remove_index(Recipe, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0004_shoppinglistline'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.RunPython(add_search_indexes, remove_search_indexes),
+    ]
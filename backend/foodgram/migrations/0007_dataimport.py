@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0006_recipe_pub_date_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=200, unique=True, verbose_name='Источник')),
+                ('checksum', models.CharField(max_length=64, verbose_name='SHA-256 файла')),
+                ('rows', models.PositiveIntegerField(verbose_name='Строк в файле')),
+                ('imported_at', models.DateTimeField(auto_now=True, verbose_name='Дата загрузки')),
+            ],
+            options={
+                'verbose_name': 'Загрузка данных',
+                'verbose_name_plural': 'Загрузки данных',
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+MAX_AMOUNT = 32767
+
+
+def merge_duplicates(apps, schema_editor):
+    """Сливает повторы ингредиента в рецепте в одну строку с суммой."""
+    AmountIngredient = apps.get_model('foodgram', 'AmountIngredient')
+    duplicates = AmountIngredient.objects.order_by().values(
+        'recipe', 'ingredient'
+    ).annotate(
+        rows=Count('id'), total=Sum('amount'), keep=Min('id')
+    ).filter(rows__gt=1)
+    for row in list(duplicates):
+        AmountIngredient.objects.filter(pk=row['keep']).update(
+            amount=min(row['total'], MAX_AMOUNT)
+        )
+        AmountIngredient.objects.filter(
+            recipe=row['recipe'], ingredient=row['ingredient']
+        ).exclude(pk=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodgram', '0009_recipe_image_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
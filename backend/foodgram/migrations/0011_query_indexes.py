@@ -0,0 +1,57 @@
+# Generated by Django 3.2.25 on 2026-10-17 04:17
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('foodgram', '0010_merge_duplicate_amounts'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='amountingredient',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='ingredient_to_recipes', to='foodgram.recipe', verbose_name='В каких рецептах'),
+        ),
+        migrations.AlterField(
+            model_name='carts',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart', to='foodgram.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='carts',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AlterField(
+            model_name='favorited',
+            name='recipe',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='favorited', to='foodgram.recipe', verbose_name='Рецепт'),
+        ),
+        migrations.AlterField(
+            model_name='favorited',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='favorited', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь'),
+        ),
+        migrations.AddIndex(
+            model_name='carts',
+            index=models.Index(fields=['recipe', 'user'], name='foodgram_carts_recipe_user'),
+        ),
+        migrations.AddIndex(
+            model_name='favorited',
+            index=models.Index(fields=['recipe', 'user'], name='foodgram_favorited_recipe_user'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='recipe_author_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='amountingredient',
+            constraint=models.UniqueConstraint(fields=('recipe', 'ingredient'), name='unique_recipe_ingredient'),
+        ),
+    ]
@@ -2,7 +2,8 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.validators import (MaxValueValidator, MinValueValidator,
                                     RegexValidator)
-from django.db import models
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import F, Sum
 
 User = get_user_model()
 
@@ -104,7 +105,24 @@ class Recipe(models.Model):
     )
     image = models.ImageField(
         'Изображение блюда',
-        upload_to='foodgram/'
+        upload_to='foodgram/',
+        db_index=True,
+    )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False,
+    )
+    carts_count = models.PositiveIntegerField(
+        'В корзинах',
+        default=0,
+        editable=False,
+    )
+    image_variants = models.JSONField(
+        'Уменьшенные копии изображения',
+        default=dict,
+        blank=True,
+        editable=False,
     )
     text = models.TextField('Описание')
     cooking_time = models.PositiveSmallIntegerField(
@@ -123,6 +141,20 @@ class Recipe(models.Model):
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='recipe_pub_date_id_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='recipe_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('-favorites_count', '-pub_date', '-id'),
+                name='recipe_popular_idx'
+            ),
+        ]
 
     def __str__(self) -> str:
         return f'{self.name}. Автор: {self.author.username}'
@@ -142,6 +174,8 @@ class AmountIngredient(models.Model):
         verbose_name='В каких рецептах',
         related_name='ingredient_to_recipes',
         on_delete=models.CASCADE,
+        # Поиск по рецепту обслуживает unique_recipe_ingredient.
+        db_index=False,
     )
     amount = models.PositiveSmallIntegerField(
         validators=[MinValueValidator(1)],
@@ -152,6 +186,12 @@ class AmountIngredient(models.Model):
         verbose_name = 'Ингридиент'
         verbose_name_plural = 'Количество ингридиентов'
         ordering = ('recipe',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'ingredient'),
+                name='unique_recipe_ingredient'
+            )
+        ]
 
     def __str__(self) -> str:
         return (
@@ -161,20 +201,200 @@ class AmountIngredient(models.Model):
         )
 
 
+def delete_rows(model, using, **columns):
+    """Удаляет строки одним DELETE без сигналов и сборщика каскада.
+
+    Для строк, зависимые данные которых вызывающий код обновляет сам.
+    Значение столбца - одно значение или коллекция для IN.
+    Возвращает число удалённых строк.
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    conditions, params = [], []
+    for column, value in columns.items():
+        if isinstance(value, (list, tuple, set, frozenset)):
+            placeholders = ', '.join(['%s'] * len(value))
+            conditions.append(f'{quote(column)} IN ({placeholders})')
+            params.extend(value)
+        else:
+            conditions.append(f'{quote(column)} = %s')
+            params.append(value)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} '
+            f'WHERE {" AND ".join(conditions)}',
+            params,
+        )
+        return cursor.rowcount
+
+
+class FavoriteShoppingCartManager(models.Manager):
+    """Добавление и удаление рецепта одним запросом к базе.
+
+    На PostgreSQL это INSERT ... ON CONFLICT и DELETE ... RETURNING,
+    совмещённые с обновлением счётчика рецепта counter_field. Сигналы
+    при этом не отправляются, поэтому счётчик обновляется здесь же.
+    Все методы сначала блокируют строки рецептов и только потом меняют
+    связи: при обратном порядке одиночный и пакетный запросы одного
+    пользователя взаимно блокировались бы.
+    """
+
+    def add(self, user, recipe_id):
+        """Возвращает (рецепт или None, была ли добавлена строка)."""
+        connection = connections[self.db]
+        if connection.vendor == 'postgresql':
+            return self._add_returning(user, recipe_id)
+        recipe = Recipe.objects.using(self.db).filter(pk=recipe_id).first()
+        if recipe is None:
+            return None, False
+        try:
+            with transaction.atomic(using=self.db):
+                self.create(user=user, recipe=recipe)
+        except IntegrityError:
+            return recipe, False
+        return recipe, True
+
+    def _add_returning(self, user, recipe_id):
+        # INSERT ... ON CONFLICT DO NOTHING и прибавка к счётчику
+        # выполняются одной командой, рецепт для ответа читается в ней же.
+        # INSERT берёт строки из recipe, поэтому рецепт блокируется раньше.
+        quote = connections[self.db].ops.quote_name
+        table = quote(self.model._meta.db_table)
+        recipes = quote(Recipe._meta.db_table)
+        counter = quote(self.model.counter_field)
+        recipe = next(iter(Recipe.objects.db_manager(self.db).raw(
+            f"""
+            WITH recipe AS (
+                SELECT id, name, image, image_variants, cooking_time
+                FROM {recipes} WHERE id = %s
+                FOR UPDATE
+            ), inserted AS (
+                INSERT INTO {table} (user_id, recipe_id)
+                SELECT %s, id FROM recipe
+                ON CONFLICT DO NOTHING
+                RETURNING recipe_id
+            ), counted AS (
+                UPDATE {recipes} SET {counter} = {counter} + 1
+                WHERE id IN (SELECT recipe_id FROM inserted)
+            )
+            SELECT recipe.*, EXISTS (SELECT 1 FROM inserted) AS created
+            FROM recipe
+            """,
+            (recipe_id, user.pk),
+        )), None)
+        if recipe is None:
+            return None, False
+        return recipe, recipe.created
+
+    def remove(self, user, recipe_id):
+        """Удаляет строку, возвращает True, если она была."""
+        connection = connections[self.db]
+        if connection.vendor == 'postgresql':
+            quote = connection.ops.quote_name
+            recipes = quote(Recipe._meta.db_table)
+            counter = quote(self.model.counter_field)
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"""
+                    WITH recipe AS (
+                        SELECT id FROM {recipes} WHERE id = %s FOR UPDATE
+                    ), deleted AS (
+                        DELETE FROM {quote(self.model._meta.db_table)}
+                        WHERE user_id = %s
+                        AND recipe_id IN (SELECT id FROM recipe)
+                        RETURNING recipe_id
+                    ), counted AS (
+                        UPDATE {recipes} SET {counter} = {counter} - 1
+                        WHERE id IN (SELECT recipe_id FROM deleted)
+                        AND {counter} > 0
+                    )
+                    SELECT EXISTS (SELECT 1 FROM deleted)
+                    """,
+                    (recipe_id, user.pk),
+                )
+                return cursor.fetchone()[0]
+        with transaction.atomic(using=self.db):
+            self._lock_recipes([recipe_id])
+            deleted = delete_rows(
+                self.model, self.db, user_id=user.pk, recipe_id=recipe_id
+            )
+            if deleted:
+                self._shift_counter([recipe_id], -1)
+        return bool(deleted)
+
+    @transaction.atomic
+    def add_many(self, user, recipe_ids):
+        """Добавляет рецепты пачкой.
+
+        Возвращает словарь найденных рецептов и множество id добавленных.
+        Рецепты блокируются до конца транзакции, поэтому параллельные
+        запросы не добавят их дважды и не собьют счётчик.
+        """
+        recipes = self._lock_recipes(recipe_ids)
+        present = set(self.filter(
+            user=user, recipe__in=recipes
+        ).values_list('recipe', flat=True))
+        created = recipes.keys() - present
+        self.bulk_create(
+            (self.model(user=user, recipe_id=pk) for pk in created),
+            ignore_conflicts=True,
+        )
+        self._shift_counter(created, 1)
+        return recipes, created
+
+    @transaction.atomic
+    def remove_many(self, user, recipe_ids):
+        """Удаляет рецепты пачкой, возвращает множество id удалённых."""
+        self._lock_recipes(recipe_ids)
+        removed = set(self.filter(
+            user=user, recipe__in=recipe_ids
+        ).values_list('recipe', flat=True))
+        if removed:
+            delete_rows(
+                self.model, self.db, user_id=user.pk, recipe_id=removed
+            )
+            self._shift_counter(removed, -1)
+        return removed
+
+    def _lock_recipes(self, recipe_ids):
+        """Блокирует рецепты в порядке id, возвращает их словарь по id."""
+        return Recipe.objects.using(self.db).select_for_update().filter(
+            pk__in=recipe_ids
+        ).order_by('pk').in_bulk()
+
+    def _shift_counter(self, recipe_ids, delta):
+        if not recipe_ids:
+            return
+        field = self.model.counter_field
+        recipes = Recipe.objects.using(self.db).filter(pk__in=recipe_ids)
+        if delta < 0:
+            recipes = recipes.filter(**{f'{field}__gt': 0})
+        recipes.update(**{field: F(field) + delta})
+
+
 class FavoriteShoppingCart(models.Model):
     """Связывающая модель списка покупок и избранного."""
 
+    counter_field = None
+
+    # Одиночные индексы по внешним ключам не нужны: запросы по
+    # пользователю идут по уникальному (user, recipe), а по рецепту —
+    # по индексу (recipe, user).
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
         verbose_name='Пользователь',
+        db_index=False,
     )
     recipe = models.ForeignKey(
         Recipe,
         on_delete=models.CASCADE,
         verbose_name='Рецепт',
+        db_index=False,
     )
 
+    objects = FavoriteShoppingCartManager()
+
     class Meta:
         abstract = True
         constraints = [
@@ -183,6 +403,12 @@ class FavoriteShoppingCart(models.Model):
                 name='%(app_label)s_%(class)s_unique'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=('recipe', 'user'),
+                name='%(app_label)s_%(class)s_recipe_user'
+            ),
+        ]
 
     def __str__(self) -> str:
         return f'{self.user} :: {self.recipe}'
@@ -191,6 +417,8 @@ class FavoriteShoppingCart(models.Model):
 class Favorited(FavoriteShoppingCart):
     """Класс избранных рецептов."""
 
+    counter_field = 'favorites_count'
+
     class Meta(FavoriteShoppingCart.Meta):
         default_related_name = 'favorited'
         verbose_name = 'Избранное'
@@ -200,7 +428,116 @@ class Favorited(FavoriteShoppingCart):
 class Carts(FavoriteShoppingCart):
     """Рецепты в корзине покупок."""
 
+    counter_field = 'carts_count'
+
     class Meta(FavoriteShoppingCart.Meta):
         default_related_name = 'shopping_cart'
         verbose_name = 'Корзина'
         verbose_name_plural = 'Корзина'
+
+
+class DataImport(models.Model):
+    """Последняя загрузка файла с данными командой load_data."""
+
+    source = models.CharField(
+        'Источник',
+        max_length=settings.LENGTH_OF_FIELDS_RECIPE,
+        unique=True,
+    )
+    checksum = models.CharField('SHA-256 файла', max_length=64)
+    rows = models.PositiveIntegerField('Строк в файле')
+    imported_at = models.DateTimeField('Дата загрузки', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Загрузка данных'
+        verbose_name_plural = 'Загрузки данных'
+
+    def __str__(self) -> str:
+        return f'{self.source} ({self.imported_at:%Y-%m-%d %H:%M})'
+
+
+class ShoppingListLineManager(models.Manager):
+    """Поддержка сводного списка покупок в актуальном состоянии."""
+
+    def live_totals(self, users=None, ingredients=None):
+        """Суммы ингредиентов по корзинам, посчитанные по рецептам."""
+        lookups = {'recipe__shopping_cart__isnull': False}
+        if users is not None:
+            lookups['recipe__shopping_cart__user__in'] = users
+        if ingredients is not None:
+            lookups['ingredient__in'] = ingredients
+        return AmountIngredient.objects.filter(**lookups).order_by().values(
+            'ingredient', user=models.F('recipe__shopping_cart__user')
+        ).annotate(total_amount=Sum('amount'))
+
+    @transaction.atomic
+    def refresh(self, users, ingredients=None):
+        """Пересчитывает строки пользователей по затронутым ингредиентам.
+
+        Строки пользователей блокируются, чтобы параллельные изменения
+        корзины не пересчитывали одни и те же строки одновременно.
+        """
+        users = list(
+            User.objects.select_for_update().filter(pk__in=users)
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        lines = self.filter(user__in=users)
+        if ingredients is not None:
+            ingredients = list(ingredients)
+            lines = lines.filter(ingredient__in=ingredients)
+        lines.delete()
+        self.bulk_create(
+            self.model(
+                user_id=row['user'],
+                ingredient_id=row['ingredient'],
+                total_amount=row['total_amount'],
+            )
+            for row in self.live_totals(users, ingredients)
+        )
+
+    def refresh_for_recipe(self, recipe, users=None, ingredients=None):
+        """Пересчитывает строки, на которые влияет рецепт.
+
+        По умолчанию затрагиваются все пользователи с рецептом в корзине
+        и текущие ингредиенты рецепта.
+        """
+        if users is None:
+            users = Carts.objects.filter(recipe=recipe).values('user')
+        if ingredients is None:
+            ingredients = AmountIngredient.objects.filter(
+                recipe=recipe
+            ).values_list('ingredient', flat=True)
+        self.refresh(users, ingredients)
+
+
+class ShoppingListLine(models.Model):
+    """Сводная строка списка покупок пользователя."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+        related_name='shopping_list',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+        related_name='shopping_list_lines',
+    )
+    total_amount = models.PositiveIntegerField('Количество')
+
+    objects = ShoppingListLineManager()
+
+    class Meta:
+        verbose_name = 'Строка списка покупок'
+        verbose_name_plural = 'Список покупок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_list_line'
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f'{self.user} :: {self.ingredient} - {self.total_amount}'
@@ -0,0 +1,107 @@
+"""Поиск: индекс ингредиентов в памяти и полнотекстовый поиск рецептов."""
+import hashlib
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.core.cache import cache
+from django.core.cache.backends.dummy import DummyCache
+
+from api.cache import get_version
+
+from .models import Ingredient
+
+SEARCH_CONFIG = 'russian'
+
+
+def recipe_search_vector():
+    """Вектор поиска рецептов, совпадающий с выражением GIN-индекса.
+
+    При изменении выражения нужна миграция, пересоздающая индекс
+    recipe_search_vector_idx, иначе PostgreSQL перестанет его использовать.
+    """
+    return (
+        SearchVector('name', weight='A', config=SEARCH_CONFIG)
+        + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+class IngredientIndex:
+    """Отсортированный по casefold-имени список ингредиентов.
+
+    Строится лениво при первом поиске. Индекс перестраивается, когда
+    меняется общая для всех процессов версия кэша ingredients или истекает
+    INGREDIENT_INDEX_TTL: срок страхует от изменений, после которых версия
+    не менялась (правка базы в обход приложения, кэш без хранения).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = None
+
+    def invalidate(self):
+        # Под блокировкой: построение, начатое до коммита изменений,
+        # не перезапишет сброс старыми строками.
+        with self._lock:
+            self._state = None
+
+    @staticmethod
+    def _version():
+        if isinstance(cache, DummyCache):
+            # Версия не сохраняется и менялась бы при каждом чтении.
+            return None
+        return get_version('ingredients')['version']
+
+    @staticmethod
+    def _is_fresh(state, version):
+        return state is not None and state[3] == version and (
+            time.monotonic() - state[4] < settings.INGREDIENT_INDEX_TTL
+        )
+
+    def _build(self, version):
+        rows = sorted(
+            Ingredient.objects.values('id', 'name', 'measurement_unit'),
+            key=lambda row: (row['name'].casefold(), row['id']),
+        )
+        keys = [row['name'].casefold() for row in rows]
+        digest = hashlib.sha1()
+        for row in rows:
+            digest.update(
+                f"{row['id']}\0{row['name']}\0{row['measurement_unit']}\n"
+                .encode()
+            )
+        return keys, rows, digest.hexdigest(), version, time.monotonic()
+
+    def _get_state(self):
+        # Версия читается до строк: если её сменят во время построения,
+        # индекс со старой версией перестроится при следующем поиске.
+        version = self._version()
+        state = self._state
+        if not self._is_fresh(state, version):
+            with self._lock:
+                state = self._state
+                if not self._is_fresh(state, version):
+                    state = self._state = self._build(version)
+        return state
+
+    @property
+    def digest(self):
+        """Хэш содержимого индекса, одинаковый во всех процессах."""
+        return self._get_state()[2]
+
+    def search(self, prefix, limit):
+        """Первые limit ингредиентов, название которых начинается с prefix."""
+        keys, rows = self._get_state()[:2]
+        prefix = prefix.casefold()
+        start = bisect_left(keys, prefix)
+        result = []
+        for position in range(start, min(start + limit, len(keys))):
+            if not keys[position].startswith(prefix):
+                break
+            result.append(rows[position])
+        return result
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,153 @@
+from contextvars import ContextVar
+
+from django.core.signals import request_finished
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from users.models import User
+
+from .counters import COUNTERS
+from .images import release_image, schedule_variants
+from .models import (AmountIngredient, Carts, Favorited, Ingredient, Recipe,
+                     ShoppingListLine)
+from .search import ingredient_index
+
+# Удаляемые сейчас рецепты -> пользователи, у которых они в корзине,
+# и удаляемые пользователи. Строки, удалённые каскадом вместе с ними,
+# обрабатываются разом в сигналах рецепта и пользователя, а не по одной.
+# Записи снимаются в post_delete, а если удаление откатилось, то в конце
+# запроса.
+deleting_recipes = ContextVar('deleting_recipes', default={})
+deleting_users = ContextVar('deleting_users', default=frozenset())
+
+
+def cascaded(instance):
+    """Удаляется ли строка избранного или корзины каскадом."""
+    return (
+        instance.recipe_id in deleting_recipes.get()
+        or instance.user_id in deleting_users.get()
+    )
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    # После коммита: до него построение индекса прочитало бы старые строки.
+    transaction.on_commit(ingredient_index.invalidate)
+
+
+@receiver(post_save, sender=Recipe)
+def prepare_image_variants(instance, **kwargs):
+    if instance.image and (
+        instance.image_variants.get('source') != instance.image.name
+    ):
+        schedule_variants(instance)
+
+
+@receiver(pre_save, sender=Recipe)
+def release_replaced_image(instance, update_fields=None, **kwargs):
+    if instance.pk is None or (
+        update_fields is not None and 'image' not in update_fields
+    ):
+        return
+    old = Recipe.objects.filter(pk=instance.pk).values_list(
+        'image', flat=True
+    ).first()
+    if old and old != instance.image.name:
+        release_image(old)
+
+
+@receiver(post_delete, sender=Recipe)
+def release_deleted_image(instance, **kwargs):
+    release_image(instance.image.name)
+
+
+@receiver(post_save, sender=Favorited)
+@receiver(post_save, sender=Carts)
+def increment_counter(sender, instance, created, **kwargs):
+    if created:
+        field = COUNTERS[sender]
+        Recipe.objects.filter(pk=instance.recipe_id).update(
+            **{field: F(field) + 1}
+        )
+
+
+@receiver(post_delete, sender=Favorited)
+@receiver(post_delete, sender=Carts)
+def decrement_counter(sender, instance, **kwargs):
+    if cascaded(instance):
+        return
+    field = COUNTERS[sender]
+    Recipe.objects.filter(pk=instance.recipe_id, **{f'{field}__gt': 0}).update(
+        **{field: F(field) - 1}
+    )
+
+
+@receiver(pre_delete, sender=Recipe)
+def remember_deleted_recipe(instance, **kwargs):
+    deleting_recipes.set({
+        **deleting_recipes.get(),
+        instance.pk: list(
+            Carts.objects.filter(recipe=instance).values_list(
+                'user', flat=True
+            )
+        ),
+    })
+
+
+@receiver(post_delete, sender=Recipe)
+def refresh_deleted_recipe_lists(instance, **kwargs):
+    deleting = dict(deleting_recipes.get())
+    users = deleting.pop(instance.pk, None)
+    deleting_recipes.set(deleting)
+    if users:
+        ShoppingListLine.objects.refresh(users)
+
+
+@receiver(post_save, sender=Carts)
+@receiver(post_delete, sender=Carts)
+def refresh_cart_list(instance, created=True, **kwargs):
+    # Менеджер Carts добавляет и удаляет строки без сигналов и сам
+    # пересчитывает список в представлениях, сюда попадают правки
+    # из админки и каскадные удаления.
+    if created and not cascaded(instance):
+        ShoppingListLine.objects.refresh_for_recipe(
+            instance.recipe_id, users=[instance.user_id]
+        )
+
+
+@receiver(post_save, sender=AmountIngredient)
+@receiver(post_delete, sender=AmountIngredient)
+def refresh_recipe_lists(instance, **kwargs):
+    # Ингредиент строки мог смениться, поэтому списки пересчитываются
+    # целиком.
+    if instance.recipe_id not in deleting_recipes.get():
+        ShoppingListLine.objects.refresh(
+            Carts.objects.filter(recipe=instance.recipe_id).values('user')
+        )
+
+
+@receiver(pre_delete, sender=User)
+def release_deleted_user_counters(instance, **kwargs):
+    deleting_users.set(deleting_users.get() | {instance.pk})
+    for model, field in COUNTERS.items():
+        Recipe.objects.filter(
+            pk__in=model.objects.filter(user=instance).values('recipe'),
+            **{f'{field}__gt': 0},
+        ).update(**{field: F(field) - 1})
+
+
+@receiver(post_delete, sender=User)
+def forget_deleted_user(instance, **kwargs):
+    deleting_users.set(deleting_users.get() - {instance.pk})
+
+
+@receiver(request_finished)
+def forget_rolled_back_deletions(**kwargs):
+    # После отката post_delete не приходит. Под WSGI контекст потока
+    # переживает запрос, и без сброса строки этих рецептов и пользователей
+    # до конца жизни потока считались бы удаляемыми каскадом.
+    deleting_recipes.set({})
+    deleting_users.set(frozenset())
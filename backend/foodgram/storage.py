@@ -0,0 +1,58 @@
+"""Хранилище медиафайлов с именами по содержимому."""
+import hashlib
+import os
+import posixpath
+from datetime import timedelta
+
+from django.core.files.storage import FileSystemStorage
+from django.utils import timezone
+
+# Файл моложе стольких секунд не удаляется: загрузка тех же байтов
+# могла обновить его время изменения, а ссылку в базе ещё не сохранить.
+MIN_ORPHAN_AGE = 60 * 60
+
+
+def is_recent(storage, name, min_age=MIN_ORPHAN_AGE):
+    """Менялся ли файл за последние min_age секунд."""
+    deadline = timezone.now() - timedelta(seconds=min_age)
+    return storage.get_modified_time(name) > deadline
+
+
+class ContentHashStorage(FileSystemStorage):
+    """Называет файлы по SHA-256 содержимого.
+
+    Одинаковые загрузки попадают в один файл и повторно не пишутся,
+    а файл под своим именем никогда не меняется, поэтому его можно
+    кэшировать навсегда. Лишние файлы удаляет команда collect_media.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Имя всё равно вычисляется по содержимому в _save.
+        return name
+
+    @staticmethod
+    def hash_content(content):
+        digest = hashlib.sha256()
+        if hasattr(content, 'seek'):
+            content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        return digest.hexdigest()
+
+    def get_hashed_name(self, name, content):
+        directory, filename = posixpath.split(name)
+        extension = posixpath.splitext(filename)[1].lower()
+        digest = self.hash_content(content)
+        return posixpath.join(
+            directory, digest[:2], f'{digest}{extension}'
+        )
+
+    def _save(self, name, content):
+        name = self.get_hashed_name(name, content)
+        if self.exists(name):
+            # Свежее время изменения защищает файл от collect_media,
+            # пока ссылка на него ещё не сохранена в базе.
+            os.utime(self.path(name))
+            return name
+        return super()._save(name, content)
@@ -0,0 +1,111 @@
+from unittest import skipUnless
+
+from django.db import connection, transaction
+from django.db.models.signals import pre_delete
+from django.test import TestCase, override_settings
+
+from api.cache import bump_version
+from users.models import User
+
+from .management.commands._benchmark import seed
+from .management.commands.explain_queries import Command as ExplainQueries
+from .models import Carts, Favorited, Ingredient, Recipe
+from .search import ingredient_index
+
+
+@skipUnless(
+    connection.vendor == 'postgresql', 'планы проверяются на PostgreSQL'
+)
+class QueryPlanTest(TestCase):
+    """Основные запросы API идут по ожидаемым индексам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user_ids, cls.recipe_ids = seed(recipes=5000, users=200)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_indexes(self):
+        command = ExplainQueries()
+        cases = command.get_cases(
+            self.user_ids[0], self.recipe_ids[0], self.recipe_ids[:6]
+        )
+        for name, queryset, expected in cases:
+            with self.subTest(name):
+                plan = queryset.explain()
+                self.assertTrue(
+                    command.check_plan(queryset, plan, expected), plan
+                )
+
+
+class IngredientIndexTest(TestCase):
+    """Индекс ингредиентов не отстаёт от базы."""
+
+    def setUp(self):
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+        ingredient_index.invalidate()
+        self.assertEqual(len(ingredient_index.search('с', 10)), 1)
+
+    def assert_found(self, names):
+        self.assertEqual(
+            [row['name'] for row in ingredient_index.search('с', 10)], names
+        )
+
+    def test_saved_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name='сахар', measurement_unit='г')
+            self.assert_found(['соль'])
+        self.assert_found(['сахар', 'соль'])
+
+    def test_version_bumped_elsewhere(self):
+        # Так load_data сообщает о bulk_create и другие процессы о правках.
+        Ingredient.objects.bulk_create(
+            [Ingredient(name='сода', measurement_unit='г')]
+        )
+        self.assert_found(['соль'])
+        bump_version('ingredients')
+        self.assert_found(['сода', 'соль'])
+
+    @override_settings(INGREDIENT_INDEX_TTL=0)
+    def test_expired(self):
+        Ingredient.objects.filter(name='соль').update(name='сыр')
+        self.assert_found(['сыр'])
+
+
+class RolledBackDeletionTest(TestCase):
+    """Откаченное удаление не оставляет записей о каскаде."""
+
+    @classmethod
+    def setUpTestData(cls):
+        user_ids, recipe_ids = seed(
+            users=2, recipes=2, ingredients=5, follows_per_user=0,
+            favorites_per_user=0, carts_per_user=0,
+        )
+        cls.user = User.objects.get(pk=user_ids[0])
+        cls.recipe = Recipe.objects.get(pk=recipe_ids[0])
+
+    def delete_and_roll_back(self, instance):
+        def fail(**kwargs):
+            raise RuntimeError('откат')
+
+        pre_delete.connect(fail, sender=type(instance))
+        try:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                instance.delete()
+        finally:
+            pre_delete.disconnect(fail, sender=type(instance))
+        self.client.get('/api/tags/')
+
+    def test_user(self):
+        Favorited.objects.create(user=self.user, recipe=self.recipe)
+        self.delete_and_roll_back(self.user)
+        Favorited.objects.get(user=self.user, recipe=self.recipe).delete()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_recipe(self):
+        Carts.objects.create(user=self.user, recipe=self.recipe)
+        self.delete_and_roll_back(self.recipe)
+        Carts.objects.get(user=self.user, recipe=self.recipe).delete()
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.carts_count, 0)
@@ -0,0 +1,58 @@
+"""Настройки gunicorn из переменных окружения.
+
+gunicorn -c python:foodgram_backend.gunicorn_conf foodgram_backend.wsgi
+
+По умолчанию gthread: потоки воркера делят пул соединений с базой
+(DB_POOL_MAX_SIZE) и не простаивают, пока запрос ждёт ответа базы.
+Для ASGI: GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker,
+приложение foodgram_backend.asgi и ASYNC_VIEWS=True.
+"""
+import multiprocessing
+import os
+
+cpu_count = multiprocessing.cpu_count()
+
+bind = os.getenv('GUNICORN_BIND', '0:8000')
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv(
+    'GUNICORN_THREADS', 4 if worker_class == 'gthread' else 1
+))
+# Кэш в памяти процесса (LocMemCache по умолчанию) другие воркеры не
+# видят, и сброс кэша по сигналам дошёл бы только до одного из них.
+# Пока общий кэш не настроен, воркер один, параллельность дают потоки.
+shared_cache = not any(
+    name in os.getenv('CACHE_BACKEND', 'locmem').lower()
+    for name in ('locmem', 'dummy')
+)
+# Синхронным воркерам нужно больше процессов, потоковым и асинхронным
+# хватит по ядру.
+workers = int(os.getenv(
+    'GUNICORN_WORKERS',
+    1 if not shared_cache
+    else cpu_count + 1 if threads > 1 or 'uvicorn' in worker_class
+    else cpu_count * 2 + 1,
+))
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+# Перезапуск воркеров со сдвигом, чтобы они не уходили на рестарт разом.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 100))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+accesslog = os.getenv('GUNICORN_ACCESSLOG')
+
+
+def when_ready(server):
+    """Закрывает соединения мастера перед запуском воркеров.
+
+    С preload_app мастер загружает Django до fork, и соединение,
+    открытое при загрузке, иначе досталось бы всем воркерам сразу.
+    """
+    if not server.cfg.preload_app:
+        return
+    from django.db import connections
+
+    from foodgram_backend.postgresql.base import close_pools
+
+    connections.close_all()
+    close_pools()
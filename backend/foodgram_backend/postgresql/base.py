@@ -0,0 +1,193 @@
+"""PostgreSQL с проверкой постоянных соединений и пулом внутри процесса.
+
+Ключи DATABASES, которые читает этот бэкенд:
+
+* CONN_HEALTH_CHECKS: перед первым запросом к базе в очередном
+  HTTP-запросе соединение, оставшееся с прошлого раза, проверяется
+  SELECT 1 и переоткрывается, если сервер его уже закрыл;
+* POOL: словарь с min_size, max_size, check_idle и timeout. Соединения
+  всех потоков процесса берутся из общего пула psycopg2 и возвращаются
+  в него вместо закрытия. Пул держит не больше min_size простаивающих
+  соединений. Когда заняты все max_size, поток ждёт возврата соединения
+  до timeout секунд и только потом получает PoolError. Соединения берут
+  потоки запросов, пул обработки картинок (RECIPE_IMAGE_WORKERS),
+  а под ASGI ещё и пул sync_to_async (ASGI_THREADS), max_size считается
+  по всем им, см. проверку api.W001.
+  С CONN_HEALTH_CHECKS проверяются только соединения, пролежавшие
+  в пуле дольше check_idle секунд.
+"""
+import threading
+import time
+
+import psycopg2.extras
+from psycopg2 import extensions, pool
+
+from django.db.backends.postgresql import base
+
+_pools = {}
+_lock = threading.Lock()
+
+
+class ConnectionPool(pool.ThreadedConnectionPool):
+    """Пул, проверяющий при выдаче долго простаивавшие соединения.
+
+    ThreadedConnectionPool сразу бросает PoolError, если все maxconn
+    соединений заняты, здесь выдачу ограничивает семафор с ожиданием
+    до timeout секунд (None - без ограничения).
+    """
+
+    def __init__(self, minconn, maxconn, check_idle=None, timeout=None,
+                 *args, **kwargs):
+        self.check_idle = check_idle
+        self.timeout = timeout
+        self._idle_since = {}
+        self._slots = threading.BoundedSemaphore(maxconn)
+        super().__init__(minconn, maxconn, *args, **kwargs)
+        # Соединения, открытые заранее, ждут в пуле с момента создания.
+        now = time.monotonic()
+        for connection in self._pool:
+            self._idle_since[id(connection)] = now
+
+    def getconn(self, key=None):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise pool.PoolError(
+                f'Все {self.maxconn} соединений пула заняты дольше '
+                f'{self.timeout} с'
+            )
+        try:
+            return self._checkout(key)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _checkout(self, key):
+        # После перезапуска сервера мёртвыми могут оказаться все
+        # соединения пула, поэтому проверка идёт до живого или нового.
+        while True:
+            connection = super().getconn(key)
+            with self._lock:
+                idle_since = self._idle_since.pop(id(connection), None)
+            if (
+                self.check_idle is None
+                or idle_since is None
+                or time.monotonic() - idle_since <= self.check_idle
+                or is_alive(connection)
+            ):
+                return connection
+            super().putconn(connection, key, close=True)
+
+    def putconn(self, connection, key=None, close=False):
+        try:
+            super().putconn(connection, key, close)
+        finally:
+            self._slots.release()
+        # Лишние сверх min_size соединения пул закрывает сам.
+        if not connection.closed:
+            with self._lock:
+                self._idle_since[id(connection)] = time.monotonic()
+
+
+def get_pool(alias, settings_dict, conn_params):
+    # Параметры входят в ключ: тестовая база подменяет NAME у того же alias.
+    key = (alias, repr(sorted(conn_params.items())))
+    connection_pool = _pools.get(key)
+    if connection_pool is None:
+        with _lock:
+            connection_pool = _pools.get(key)
+            if connection_pool is None:
+                options = settings_dict['POOL']
+                connection_pool = _pools[key] = ConnectionPool(
+                    options.get('min_size', 1),
+                    options.get('max_size', 10),
+                    options.get('check_idle', 30)
+                    if settings_dict.get('CONN_HEALTH_CHECKS') else None,
+                    options.get('timeout'),
+                    **conn_params,
+                )
+    return connection_pool
+
+
+def close_pools():
+    """Закрывает соединения всех пулов процесса."""
+    with _lock:
+        for connection_pool in _pools.values():
+            connection_pool.closeall()
+        _pools.clear()
+
+
+def is_alive(connection):
+    if connection.closed:
+        return False
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if not connection.autocommit:
+            connection.rollback()
+    except psycopg2.Error:
+        return False
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    health_check_done = False
+
+    @property
+    def pool(self):
+        if not self.settings_dict.get('POOL'):
+            return None
+        return get_pool(
+            self.alias, self.settings_dict, self.get_connection_params()
+        )
+
+    def get_new_connection(self, conn_params):
+        connection_pool = self.pool
+        if connection_pool is None:
+            return super().get_new_connection(conn_params)
+        connection = connection_pool.getconn()
+        # Настройка соединения как в базовом классе, но без connect().
+        options = self.settings_dict['OPTIONS']
+        try:
+            self.isolation_level = options['isolation_level']
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(
+            conn_or_curs=connection, loads=lambda x: x
+        )
+        return connection
+
+    def _close(self):
+        connection_pool = self.pool
+        if connection_pool is None or self.connection is None:
+            return super()._close()
+        status = self.connection.info.transaction_status
+        with self.wrap_database_errors:
+            connection_pool.putconn(
+                self.connection,
+                close=self.errors_occurred
+                or status == extensions.TRANSACTION_STATUS_UNKNOWN,
+            )
+
+    def connect(self):
+        # Новое соединение не проверяется, а connect() сам вызывает
+        # ensure_connection() через set_autocommit().
+        self.health_check_done = True
+        super().connect()
+
+    def close_if_unusable_or_obsolete(self):
+        # Вызывается в начале и в конце каждого HTTP-запроса.
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None
+            and not self.health_check_done
+            and self.settings_dict.get('CONN_HEALTH_CHECKS')
+        ):
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+        super().ensure_connection()
@@ -41,6 +41,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework.authtoken',
     'rest_framework',
     'drf_extra_fields',
@@ -52,6 +53,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.metrics.MetricsMiddleware',
+    'api.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -80,20 +83,68 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'foodgram_backend.wsgi.application'
+ASGI_APPLICATION = 'foodgram_backend.asgi.application'
 
+# Асинхронные обёртки читающих эндпоинтов, имеет смысл под ASGI.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
 
-DATABASES = {
+
+if os.getenv('DB_ENGINE', 'postgresql') == 'sqlite3':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+        }
+    }
+else:
+    DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 0))
+    DATABASES = {
+        'default': {
+            'ENGINE': 'foodgram_backend.postgresql',
+            'NAME': os.getenv('POSTGRES_DB'),
+            'USER': os.getenv('POSTGRES_USER'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
+            'HOST': os.getenv('DB_HOST'),
+            'PORT': os.getenv('DB_PORT'),
+            # Соединение живёт между запросами, 0 закрывает его сразу.
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+            'CONN_HEALTH_CHECKS': (
+                os.getenv('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+            ),
+        }
+    }
+    if DB_POOL_MAX_SIZE:
+        # Пул общий для потоков процесса, соединение возвращается
+        # в него в конце каждого запроса.
+        DATABASES['default'].update(
+            CONN_MAX_AGE=0,
+            POOL={
+                'min_size': int(os.getenv('DB_POOL_MIN_SIZE', 2)),
+                'max_size': DB_POOL_MAX_SIZE,
+                'check_idle': int(os.getenv('DB_POOL_CHECK_IDLE', 30)),
+                'timeout': int(os.getenv('DB_POOL_TIMEOUT', 10)),
+            },
+        )
+
+CACHES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
-        'NAME': os.getenv('POSTGRES_DB'),
-        'USER': os.getenv('POSTGRES_USER'),
-        'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
-        'HOST': os.getenv('DB_HOST'),
-        'PORT': os.getenv('DB_PORT'),
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
+        'TIMEOUT': int(os.getenv('CACHE_TIMEOUT', 60 * 60)),
     }
 }
 
 
+METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'True') == 'True'
+METRICS_QUERY_THRESHOLD = int(os.getenv('METRICS_QUERY_THRESHOLD', 30))
+METRICS_ALLOWED_IPS = [
+    ip for ip in os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1').split(',')
+    if ip
+]
+
+
 AUTH_USER_MODEL = 'users.User'
 
 
@@ -119,15 +170,31 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.SearchFilter',
     ],
+
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
+# Сжатие ответов: порог в байтах и качество brotli от 0 до 11.
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 5))
+
+# Кэш токенов: размер и время жизни в памяти процесса, время жизни
+# в общем кэше. Сброс по сигналам до других процессов не доходит,
+# поэтому в памяти запись живёт недолго.
+TOKEN_CACHE_SIZE = int(os.getenv('TOKEN_CACHE_SIZE', 1024))
+TOKEN_CACHE_LOCAL_TTL = int(os.getenv('TOKEN_CACHE_LOCAL_TTL', 10))
+TOKEN_CACHE_TIMEOUT = int(os.getenv('TOKEN_CACHE_TIMEOUT', 5 * 60))
+
 DJOSER = {
     "HIDE_USERS": False,
     "LOGIN_FIELD": 'email',
@@ -160,6 +227,17 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static/')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+DEFAULT_FILE_STORAGE = 'foodgram.storage.ContentHashStorage'
+
+RECIPE_IMAGE_MAX_SIZE = int(os.getenv('RECIPE_IMAGE_MAX_SIZE', 5 * 1024 ** 2))
+RECIPE_IMAGE_VARIANTS = {
+    'thumbnail': (480, 480),
+    'detail': (1200, 1200),
+}
+RECIPE_IMAGE_QUALITY = 80
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', 2))
+
+RECIPE_BULK_MAX = int(os.getenv('RECIPE_BULK_MAX', 100))
 
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
@@ -170,3 +248,16 @@ LENGTH_OF_FIELDS_SHORT = 150
 LENGTH_OF_FIELDS_LONG = 254
 
 LENGTH_OF_FIELDS_RECIPE = 200
+
+INGREDIENT_AUTOCOMPLETE_LIMIT = 10
+
+INGREDIENT_AUTOCOMPLETE_MAX_LIMIT = 50
+
+INGREDIENT_AUTOCOMPLETE_MAX_AGE = 60
+
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 5 * 60))
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)